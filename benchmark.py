@@ -0,0 +1,623 @@
+"""
+Benchmarks for the browser engine.
+
+Each benchmark compares the current tree against a baseline git revision
+(the first commit of the repository by default), whose modules are loaded
+straight from `git show`.
+
+Usage:
+    python benchmark.py parse [--size 4] [--baseline REV]
+    python benchmark.py memory [--size 4] [--baseline REV]
+    python benchmark.py text-rss [--size 4]
+    python benchmark.py selectors [--size 1] [--rules 1000]
+    python benchmark.py css [--size 1 4] [--baseline REV]
+    python benchmark.py linebreak [--size 1 4] [--words 5000]
+    python benchmark.py layout [--items 50000] [--baseline REV]  (needs a display)
+    python benchmark.py firstpaint [--items 50000]  (needs a display)
+"""
+
+import gc
+import os
+import sys
+import time
+import types
+import random
+import argparse
+import subprocess
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod "
+    "tempor incididunt ut labore et dolore magna aliqua browser layout engine"
+).split()
+
+
+def git_root_commit():
+    """
+    Returns the hash of the first commit of the repository.
+    """
+    output = subprocess.check_output(
+        ["git", "rev-list", "--max-parents=0", "HEAD"], cwd=ROOT, text=True
+    )
+    return output.split()[-1]
+
+
+def load_modules_at(rev: str, names: list[str]):
+    """
+    Loads the given top-level modules as they were at git revision `rev`.
+    Modules are executed in order, so list dependencies first: while loading,
+    each name resolves to its baseline version for the modules that import it.
+
+    :return: A dict mapping module names to the loaded modules.
+    """
+    saved = {name: sys.modules.get(name) for name in names}
+    loaded = {}
+    try:
+        for name in names:
+            source = subprocess.check_output(
+                ["git", "show", f"{rev}:{name}.py"], cwd=ROOT, text=True
+            )
+            module = types.ModuleType(f"{name}@{rev[:7]}")
+            sys.modules[name] = module
+            exec(compile(source, f"{rev[:7]}:{name}.py", "exec"), module.__dict__)
+            loaded[name] = module
+    finally:
+        for name, module in saved.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+    return loaded
+
+
+def synthetic_html(size: int, seed: int = 0, paragraph_words: int = 120):
+    """
+    Generates a well-formed HTML document of roughly `size` characters with
+    nested sections, attributes, comments, inline elements and long text runs
+    (of up to `paragraph_words` words per paragraph).
+    """
+    rnd = random.Random(seed)
+    parts = [
+        "<!DOCTYPE html>\n<html>\n<head>\n<title>Synthetic page</title>\n",
+        '<link rel="stylesheet" href="style.css" />\n',
+        "<style>body { color: black; }</style>\n</head>\n<body>\n",
+    ]
+    length = sum(len(part) for part in parts)
+    n = 0
+    while length < size:
+        words = " ".join(
+            rnd.choice(WORDS) for _ in range(rnd.randint(20, paragraph_words))
+        )
+        section = (
+            f'<div class="section s{n % 7}" id="section-{n}">\n'
+            f"  <h2>Section {n}</h2>\n"
+            f"  <!-- section {n} -->\n"
+            f"  <p>{words[:200]} <b>{rnd.choice(WORDS)}</b>\n    {words[200:]}</p>\n"
+            f'  <ul>\n    <li><a href="/page/{n}">link {n}</a></li>\n'
+            f'    <li><img src="/img/{n}.png" alt="image {n}"/></li>\n  </ul>\n'
+            f"  <br />\n</div>\n"
+        )
+        parts.append(section)
+        length += len(section)
+        n += 1
+    parts.append("</body>\n</html>\n")
+    return "".join(parts)
+
+
+def best_of(fn, repeat: int = 3):
+    """
+    Runs `fn` `repeat` times and returns `(best time in seconds, last result)`.
+    """
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def dump_tree(root):
+    """
+    Flattens a DOM tree into a comparable list of node descriptions.
+    """
+    out = []
+    stack = [(root, 0)]
+    while stack:
+        node, depth = stack.pop()
+        kind = type(node).__name__
+        if kind == "SourceText":
+            kind = "Text"
+        if kind == "Element":
+            out.append((depth, kind, node.tag, sorted(node.attributes.items())))
+        elif kind == "Text":
+            out.append((depth, kind, node.text))
+        elif kind == "Comment":
+            out.append((depth, kind, node.comment))
+        else:
+            out.append((depth, kind))
+        for child in reversed(getattr(node, "children", [])):
+            stack.append((child, depth + 1))
+    return out
+
+
+def bench_parse(args):
+    from html_parser import HTMLParser
+
+    baseline = load_modules_at(args.baseline, ["nodes", "html_parser"])
+    BaselineParser = baseline["html_parser"].HTMLParser
+
+    for size_mb in args.size:
+        html = synthetic_html(int(size_mb * 1024 * 1024))
+        before, old_root = best_of(lambda: BaselineParser(html).parse(), args.repeat)
+        after, new_root = best_of(lambda: HTMLParser(html).parse(), args.repeat)
+        same = dump_tree(old_root) == dump_tree(new_root)
+        print(
+            f"parse {len(html) / 1e6:6.2f} MB: "
+            f"before {before:7.3f}s  after {after:7.3f}s  "
+            f"speedup {before / after:5.1f}x  same tree: {same}"
+        )
+
+
+def retained_memory(fn):
+    """
+    Calls `fn` and returns `(bytes still allocated by it afterwards, its result)`.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = fn()
+        gc.collect()
+        retained, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return retained, result
+
+
+def bench_memory(args):
+    from html_parser import HTMLParser
+
+    baseline = load_modules_at(args.baseline, ["nodes", "html_parser"])
+    BaselineParser = baseline["html_parser"].HTMLParser
+
+    for size_mb in args.size:
+        html = synthetic_html(int(size_mb * 1024 * 1024))
+        before, old_root = retained_memory(lambda: BaselineParser(html).parse())
+        nodes = len(dump_tree(old_root))
+        del old_root
+        after, new_root = retained_memory(lambda: HTMLParser(html).parse())
+        del new_root
+        print(
+            f"memory {len(html) / 1e6:6.2f} MB, {nodes} nodes: "
+            f"before {before / nodes:6.1f} B/node  after {after / nodes:6.1f} B/node  "
+            f"saved {100 * (1 - after / before):4.1f}%"
+        )
+
+
+def _proc_status(field: str):
+    with open("/proc/self/status") as file:
+        for line in file:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) * 1024
+    raise OSError(f"{field} not found")
+
+
+def peak_rss():
+    """
+    Returns the peak resident set size of this process in bytes
+    (since the last `reset_peak_rss` where supported).
+    """
+    try:
+        return _proc_status("VmHWM")
+    except OSError:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # bytes on macOS, kilobytes elsewhere
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def reset_peak_rss():
+    """
+    Resets the peak RSS to the current RSS (Linux only) and returns it.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+        return _proc_status("VmRSS")
+    except OSError:
+        return peak_rss()
+
+
+def text_rss_worker(mode: str, path: str):
+    """
+    Parses the page stored at `path` in a fresh process and prints the
+    RSS before parsing and the peak RSS while parsing.
+    """
+    from html_parser import HTMLParser
+
+    with open(path, "rb") as file:
+        html = file.read().decode("utf-8")
+    gc.collect()
+    before = reset_peak_rss()
+    root = HTMLParser(html, lazy_text=mode == "lazy").parse()
+    after = peak_rss()
+    print(before, after, len(dump_tree(root)))
+
+
+def bench_text_rss(args):
+    import tempfile
+
+    for size_mb in args.size:
+        size = int(size_mb * 1024 * 1024)
+        # a text-heavy page, written to disk so that the worker processes
+        # don't count the memory used to generate it
+        with tempfile.NamedTemporaryFile("wb", suffix=".html", delete=False) as file:
+            file.write(synthetic_html(size, paragraph_words=2000).encode("utf-8"))
+        for mode in ("eager", "lazy"):
+            output = subprocess.check_output(
+                [sys.executable, __file__, "--text-rss-worker", mode, file.name],
+                cwd=ROOT,
+                text=True,
+            )
+            before, after, nodes = map(int, output.split())
+            print(
+                f"text-rss {size / 1e6:6.2f} MB, {nodes} nodes, {mode:5} text: "
+                f"peak RSS {after / 1e6:7.1f} MB "
+                f"(+{(after - before) / 1e6:6.1f} MB while parsing)"
+            )
+        os.remove(file.name)
+
+
+def synthetic_rules(count: int, seed: int = 0):
+    """
+    Generates `count` `(selector, declarations)` rules for the pages of `synthetic_html`,
+    mixing tag, class, id, compound, descendant and child selectors.
+    """
+    rnd = random.Random(seed)
+    tags = ["div", "p", "h2", "ul", "li", "a", "img", "b", "span", "section"]
+
+    def compound():
+        kind = rnd.random()
+        if kind < 0.3:
+            return rnd.choice(tags)
+        if kind < 0.6:
+            return f".s{rnd.randrange(12)}"
+        if kind < 0.75:
+            return f"#section-{rnd.randrange(5000)}"
+        return f"{rnd.choice(tags)}.s{rnd.randrange(12)}"
+
+    rules = []
+    for i in range(count):
+        parts = [compound()]
+        for _ in range(rnd.choice([0, 0, 1, 1, 2])):
+            parts.insert(0, rnd.choice([" ", " > "]))
+            parts.insert(0, compound())
+        rules.append(("".join(parts), {"color": f"#{i:06x}"}))
+    return rules
+
+
+def bench_selectors(args):
+    from html_parser import HTMLParser
+    from stylesheet import Stylesheet
+
+    sheet = Stylesheet(synthetic_rules(args.rules))
+
+    def naive_match(element):
+        # what matching looks like without the rule index: test every rule
+        rules = [rule for rule in sheet.rules if rule.selector.matches(element)]
+        rules.sort(key=lambda rule: rule.priority)
+        styles = {}
+        for rule in rules:
+            styles.update(rule.declarations)
+        return styles
+
+    for size_mb in args.size:
+        root = HTMLParser(synthetic_html(int(size_mb * 1024 * 1024))).parse()
+        elements = root.get_elements_by_tag_name("*")
+        before, old = best_of(lambda: [naive_match(e) for e in elements], args.repeat)
+        after, new = best_of(lambda: [sheet.match(e) for e in elements], args.repeat)
+        print(
+            f"selectors {len(sheet)} rules, {len(elements)} elements: "
+            f"all rules {before:7.3f}s  indexed {after:7.3f}s  "
+            f"speedup {before / after:5.1f}x  same styles: {old == new}"
+        )
+
+
+def synthetic_css(size: int, seed: int = 0):
+    """
+    Generates a stylesheet of roughly `size` characters from `synthetic_rules`,
+    with comments and several declarations per rule.
+    """
+    rnd = random.Random(seed)
+    parts = []
+    length = 0
+    index = 0
+    while length < size:
+        selectors = [selector for selector, _ in synthetic_rules(rnd.randint(1, 3), index)]
+        part = (
+            f"/* rule {index} */\n"
+            + ",\n".join(selectors)
+            + " {\n"
+            + f"  color: #{index % 0xFFFFFF:06x};\n"
+            + f"  font-size: {rnd.randint(8, 40)}px;\n"
+            + f"  font-family: {rnd.choice(WORDS)}, serif;\n"
+            + "}\n\n"
+        )
+        parts.append(part)
+        length += len(part)
+        index += 1
+    return "".join(parts)
+
+
+def bench_css(args):
+    from css_parser import CSSParser
+
+    baseline = load_modules_at(args.baseline, ["css_parser"])
+    BaselineParser = baseline["css_parser"].CSSParser
+
+    def chunked(css, chunk_size=64 * 1024):
+        css_parser = CSSParser()
+        for start in range(0, len(css), chunk_size):
+            css_parser.feed(css[start : start + chunk_size])
+        return css_parser.close()
+
+    for size_mb in args.size:
+        css = synthetic_css(int(size_mb * 1024 * 1024))
+        before, old = best_of(
+            lambda: BaselineParser().parse(external_styles=css), args.repeat
+        )
+        after, new = best_of(lambda: CSSParser().parse(external_styles=css), args.repeat)
+        streamed, fed = best_of(lambda: chunked(css), args.repeat)
+        print(
+            f"css {len(css) / 1e6:6.2f} MB: "
+            f"before {before:7.3f}s  after {after:7.3f}s  64 KB chunks {streamed:7.3f}s  "
+            f"speedup {before / after:5.1f}x  same styles: {old == new == fed}"
+        )
+
+
+def bench_linebreak(args):
+    import line_breaker
+
+    def greedy(widths, space_width, max_width):
+        # the word by word loop the line breaker replaces
+        starts = []
+        line_width = None
+        for index, width in enumerate(widths):
+            if line_width is None or line_width + space_width + width > max_width:
+                starts.append(index)
+                line_width = width
+            else:
+                line_width += space_width + width
+        return starts
+
+    rnd = random.Random(0)
+    # widths of a 14px font, 7px per character
+    word_widths = {word: 7 * len(word) for word in WORDS}
+    for size_mb in args.size:
+        words = []
+        length = 0
+        while length < size_mb * 1024 * 1024:
+            word = rnd.choice(WORDS)
+            words.append(word)
+            length += len(word) + 1
+        # long articles: paragraphs of `args.words` words
+        paragraphs = [
+            [word_widths[word] for word in words[start : start + args.words]]
+            for start in range(0, len(words), args.words)
+        ]
+
+        def run(breaker):
+            return [breaker(widths, 4, 787) for widths in paragraphs]
+
+        loop, expected = best_of(lambda: run(greedy), args.repeat)
+        python, fallback = best_of(
+            lambda: run(line_breaker._break_positions_python), args.repeat
+        )
+        line = (
+            f"linebreak {len(words)} words in {len(paragraphs)} paragraphs: "
+            f"loop {loop:7.3f}s  bisect {python:7.3f}s"
+        )
+        same = expected == fallback
+        if line_breaker.np is not None:
+            vectorized, result = best_of(
+                lambda: run(line_breaker._break_positions_numpy), args.repeat
+            )
+            line += f"  numpy {vectorized:7.3f}s  speedup {loop / vectorized:5.1f}x"
+            same = same and expected == result
+        else:
+            line += "  numpy not installed"
+        print(f"{line}  same breaks: {same}")
+
+
+# modules the layout depends on, in import order (only those present at a revision are loaded)
+LAYOUT_MODULES = [
+    "nodes",
+    "traversal",
+    "serializer",
+    "html_parser",
+    "line_breaker",
+    "font",
+    "draw",
+    "stylesheet",
+    "css_tokenizer",
+    "css_parser",
+    "computed_style",
+    "layout",
+]
+
+
+def modules_at(rev: str, names: list[str]):
+    """
+    Returns the modules of `names` that exist at git revision `rev`.
+    """
+    present = []
+    for name in names:
+        result = subprocess.run(
+            ["git", "cat-file", "-e", f"{rev}:{name}.py"],
+            cwd=ROOT,
+            stderr=subprocess.DEVNULL,
+        )
+        if result.returncode == 0:
+            present.append(name)
+    return present
+
+
+def flat_list_html(items: int):
+    """
+    Generates a page with a single list of `items` short items.
+    """
+    rows = "".join(f"<li>item {i}</li>" for i in range(items))
+    return f"<html><body><ul>{rows}</ul></body></html>"
+
+
+def bench_layout(args):
+    import tkinter
+
+    try:
+        # Tk fonts need an application
+        tk_root = tkinter.Tk()
+        tk_root.withdraw()
+    except tkinter.TclError as e:
+        print(f"layout needs a display for Tk fonts: {e}")
+        return
+
+    from html_parser import HTMLParser
+    from layout import Layout
+
+    baseline = load_modules_at(
+        args.baseline, modules_at(args.baseline, LAYOUT_MODULES)
+    )
+
+    def run(parser_class, layout_class, html):
+        """
+        Lays out `html` `args.repeat` times and returns `(best time, last layout tree)`.
+        """
+        best = None
+        for _ in range(args.repeat):
+            root = parser_class(html).parse()
+            tree = layout_class(800, 600)
+            start = time.perf_counter()
+            tree.layout(root)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, tree.node
+
+    BaselineParser = baseline["html_parser"].HTMLParser
+    BaselineLayout = baseline["layout"].Layout
+    for items in (args.items // 4, args.items // 2, args.items):
+        html = flat_list_html(items)
+        before, old_tree = run(BaselineParser, BaselineLayout, html)
+        after, new_tree = run(HTMLParser, Layout, html)
+        print(
+            f"layout {items} list items: before {before:7.3f}s  after {after:7.3f}s  "
+            f"({after / items * 1e6:5.1f} us/item)  speedup {before / after:5.1f}x  "
+            f"same height: {old_tree.height == new_tree.height}"
+        )
+    tk_root.destroy()
+
+
+def bench_first_paint(args):
+    import tkinter
+
+    try:
+        # Tk fonts need an application
+        tk_root = tkinter.Tk()
+        tk_root.withdraw()
+    except tkinter.TclError as e:
+        print(f"firstpaint needs a display for Tk fonts: {e}")
+        return
+
+    from html_parser import HTMLParser
+    from layout import Layout
+
+    width, height, margin = 800, 600, 500
+
+    def run(html, lazy):
+        """
+        Lays out and renders `html` `args.repeat` times.
+
+        :return: The best times until the first screen is ready and until all of it is.
+        """
+        best_first = best_total = None
+        for _ in range(args.repeat):
+            root = HTMLParser(html).parse()
+            tree = Layout(width, height)
+            first = None
+            start = time.perf_counter()
+            if lazy:
+                for _ in tree.layout_steps(root, lazy=True):
+                    if first is None and tree.laid_out_y > height + margin:
+                        first = time.perf_counter() - start
+            else:
+                tree.layout(root)
+                tree.render(tree.node)
+            total = time.perf_counter() - start
+            if first is None:
+                first = total
+            best_first = first if best_first is None else min(best_first, first)
+            best_total = total if best_total is None else min(best_total, total)
+        return best_first, best_total
+
+    for items in (args.items // 4, args.items // 2, args.items):
+        html = flat_list_html(items)
+        eager, _ = run(html, False)
+        first, total = run(html, True)
+        print(
+            f"first paint {items} list items: eager {eager * 1000:8.1f}ms  "
+            f"lazy {first * 1000:6.1f}ms (all laid out after {total * 1000:8.1f}ms)"
+        )
+    tk_root.destroy()
+
+
+BENCHMARKS = {
+    "parse": bench_parse,
+    "memory": bench_memory,
+    "text-rss": bench_text_rss,
+    "selectors": bench_selectors,
+    "css": bench_css,
+    "linebreak": bench_linebreak,
+    "layout": bench_layout,
+    "firstpaint": bench_first_paint,
+}
+
+
+def main():
+    if sys.argv[1:2] == ["--text-rss-worker"]:
+        sys.path.insert(0, ROOT)
+        text_rss_worker(sys.argv[2], sys.argv[3])
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument(
+        "--size",
+        type=float,
+        nargs="+",
+        default=[1, 4],
+        help="document sizes in MB",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--rules", type=int, default=1000, help="stylesheet size for `selectors`"
+    )
+    parser.add_argument(
+        "--items", type=int, default=50000, help="list length for `layout` and `firstpaint`"
+    )
+    parser.add_argument(
+        "--words", type=int, default=5000, help="paragraph length for `linebreak`"
+    )
+    parser.add_argument(
+        "--baseline", default=None, help="git revision to compare against"
+    )
+    args = parser.parse_args()
+    if args.baseline is None:
+        args.baseline = git_root_commit()
+
+    sys.path.insert(0, ROOT)
+    BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+from types import MappingProxyType
+from collections import ChainMap
+from nodes import Element, EMPTY_MAPPING
+from css_parser import CSSParser
+from traversal import walk_steps
+
+
+class ComputedStyle:
+    """
+    The resolved style of an element: inherited properties, the matching rules of
+    the stylesheet and the inline `style` attribute, applied in that order.
+
+    Computed once per element (or once for a group of elements, see
+    `StyleSharingCache`) and read-only afterwards, so layout and paint only look
+    values up and never parse CSS.
+    """
+
+    __slots__ = (
+        "declared",
+        "inherited",
+        "properties",
+        "color",
+        "background_color",
+        "text_style",
+    )
+
+    # properties an element takes from its parent unless it sets them itself
+    # (text decorations propagate to descendant text as well)
+    INHERITED_PROPERTIES = (
+        "color",
+        "font-size",
+        "font-family",
+        "font-weight",
+        "font-style",
+        "text-decoration",
+    )
+
+    def __init__(self, declared: dict, parent=None):
+        """
+        :param declared: The properties set on the element by rules and its inline style.
+        :param parent: The `ComputedStyle` of the parent element, if any.
+        """
+        set_slot = object.__setattr__
+        declared = MappingProxyType(declared)
+        set_slot(self, "declared", declared)
+
+        # own properties first, then the ones inherited from the parent
+        parent_inherited = parent.inherited if parent is not None else EMPTY_MAPPING
+        properties = ChainMap(declared, parent_inherited)
+        set_slot(self, "properties", properties)
+
+        # the inherited properties in effect for the element's children: the parent's
+        # mapping itself unless the element overrides one of them (copy on write)
+        inherited = parent_inherited
+        overrides = [name for name in self.INHERITED_PROPERTIES if name in declared]
+        if overrides:
+            inherited = dict(parent_inherited)
+            for name in overrides:
+                inherited[name] = declared[name]
+            inherited = MappingProxyType(inherited)
+        set_slot(self, "inherited", inherited)
+
+        color = properties.get("color", "transparent")
+        set_slot(self, "color", color if color != "transparent" else "black")
+
+        # boxes are painted opaque, so a transparent element is painted
+        # with the background of its parent
+        background_color = properties.get("background-color", "transparent")
+        if background_color == "transparent":
+            background_color = parent.background_color if parent else "white"
+        set_slot(self, "background_color", background_color)
+
+        text_style = CSSParser().extract_text_styles(properties)
+        set_slot(self, "text_style", MappingProxyType(text_style))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ComputedStyle is read-only")
+
+    def __repr__(self):
+        return f"ComputedStyle({dict(self.properties)})"
+
+
+def compute_style(element: Element, stylesheet=None, parent_style=None):
+    """
+    Computes the style of `element`.
+
+    :param stylesheet: A `Stylesheet` or `Cascade` to match the element against.
+    :param parent_style: The `ComputedStyle` of the parent element, if any.
+    """
+    declared = {}
+    if stylesheet is not None:
+        declared.update(stylesheet.match(element))
+
+    inline_styles = element.attributes.get("style")
+    if inline_styles:
+        css_parser = CSSParser()
+        css_parser.parse(inline_styles=inline_styles)
+        declared.update(css_parser.styles)
+
+    return ComputedStyle(declared, parent_style)
+
+
+class StyleSharingCache:
+    """
+    Hands out one shared `ComputedStyle` to elements whose style inputs are the same:
+    tag, id and classes (as far as selectors use them), inline style and the very
+    same parent style.
+
+    Elements can only share a parent style if their parents had the same inputs
+    too, all the way up, so such elements match exactly the same rules.
+    """
+
+    def __init__(self, stylesheet=None):
+        self.stylesheet = stylesheet
+        self.ids = stylesheet.ids if stylesheet is not None else set()
+        self.classes = stylesheet.classes if stylesheet is not None else set()
+        self.styles = {}
+        self.elements = 0
+        self.shared = 0
+
+    def style_for(self, element: Element, parent_style=None):
+        attributes = element.attributes
+        element_id = attributes.get("id")
+        if element_id not in self.ids:
+            element_id = None
+        class_names = attributes.get("class")
+        if class_names:
+            classes = self.classes
+            class_names = frozenset(
+                name for name in class_names.split() if name in classes
+            )
+        key = (
+            element.tag,
+            element_id,
+            class_names,
+            attributes.get("style"),
+            parent_style,
+        )
+        self.elements += 1
+        style = self.styles.get(key)
+        if style is None:
+            style = self.styles[key] = compute_style(element, self.stylesheet, parent_style)
+        else:
+            self.shared += 1
+        return style
+
+    def stats(self):
+        return {
+            "elements": self.elements,
+            "styles": len(self.styles),
+            "shared": self.shared,
+        }
+
+
+def resolve_styles(root, stylesheet=None):
+    """
+    Sets `computed_style` on every element below `root`.
+
+    :return: The `StyleSharingCache` used, for its statistics.
+    """
+    steps = resolve_style_steps(root, stylesheet, batch=0)
+    while True:
+        try:
+            next(steps)
+        except StopIteration as stop:
+            return stop.value
+
+
+def resolve_style_steps(root, stylesheet=None, batch: int = 32):
+    """
+    Generator version of `resolve_styles` that yields after every `batch` nodes
+    (and returns the `StyleSharingCache` used).
+    """
+    cache = StyleSharingCache(stylesheet)
+
+    def enter(node, depth):
+        if isinstance(node, Element):
+            parent = node.parent
+            parent_style = parent.computed_style if isinstance(parent, Element) else None
+            node.computed_style = cache.style_for(node, parent_style)
+
+    yield from walk_steps(root, pre=enter, batch=batch)
+    return cache
@@ -1,4 +1,6 @@
 import re
+from stylesheet import Stylesheet
+from css_tokenizer import CSSTokenizer
 
 
 class CSSParser:
@@ -8,6 +10,10 @@ class CSSParser:
 
     def __init__(self):
         self.styles = {}
+        # (selector, declarations) for every selector of every rule, in source order,
+        # with the preludes of the enclosing at-rule blocks as a third item if any
+        self.rules = []
+        self._tokenizer = None
 
     def extract_text_styles(self, styles: dict):
         text_styles = {
@@ -43,6 +49,12 @@ class CSSParser:
                 text_styles["underline"] = True
         return text_styles
 
+    def stylesheet(self):
+        """
+        :return: A `Stylesheet` compiled from the rules of the external styles parsed so far.
+        """
+        return Stylesheet(self.rules)
+
     def parse(self, external_styles: str = "", inline_styles: str = ""):
         if external_styles:
             self._parse_external_styles(external_styles)
@@ -50,84 +62,51 @@ class CSSParser:
             self._parse_inline_styles(inline_styles)
         return self.styles
 
-    def _parse_inline_styles(self, styles: str):
-        styles = self.format_styles(styles)
+    def feed(self, chunk: str):
+        """
+        Parses the next chunk of an external stylesheet (e.g. as it downloads).
+        Rules are added to `styles` and `rules` as soon as they are complete.
+        """
+        if self._tokenizer is None:
+            self._tokenizer = CSSTokenizer()
+        for rule in self._tokenizer.feed(chunk):
+            self._add_rule(rule)
+
+    def close(self):
+        """
+        Finishes the stylesheet passed to `feed`.
+        """
+        if self._tokenizer is not None:
+            for rule in self._tokenizer.close():
+                self._add_rule(rule)
+            self._tokenizer = None
+        return self.styles
 
-        buffer = ""
-        key = ""
-        value = ""
+    def _add_rule(self, rule):
+        selectors, declarations, conditions = rule
+        # the selectors of a rule share its declarations
+        declarations = dict(declarations)
+        for selector in selectors:
+            if conditions:
+                # conditional rules (e.g. in `@media` blocks) are left out of `styles`
+                self.rules.append((selector, declarations, conditions))
+                continue
+            self.rules.append((selector, declarations))
+            if declarations:
+                self.styles.setdefault(selector, {}).update(declarations)
+
+    def _parse_inline_styles(self, styles: str):
         try:
-            for char in styles:
-                if char == ":":
-                    key = buffer.strip()
-                    buffer = ""
-                elif char == ";":
-                    value = buffer.strip()
-                    if key and value:
-                        self.styles[key] = value
-                    buffer = ""
-                else:
-                    buffer += char
-            if buffer:
-                value = buffer.strip()
-                if key and value:
-                    self.styles[key] = value
+            for key, value in CSSTokenizer.parse_declarations(styles):
+                self.styles[key] = value
         except Exception:
             print("Error parsing inline styles.")
 
     def _parse_external_styles(self, styles: str):
-        styles = self.format_styles(styles)
-
-        selectors = []
-        buffer = ""
-        key = ""
-        value = ""
+        tokenizer = CSSTokenizer()
         try:
-            for char in styles:
-                if char == "," and not key and not value:
-                    selector = buffer.strip()
-                    if selector:
-                        selectors.append(selector)
-                    buffer = ""
-                elif char == "{":
-                    selector = buffer.strip()
-                    if selector:
-                        selectors.append(selector)
-                    buffer = ""
-                elif char == ":":
-                    key = buffer.strip()
-                    buffer = ""
-                    if key:
-                        for selector in selectors:
-                            self.styles.setdefault(selector, {})[key] = ""
-                elif char == ";":
-                    value = buffer.strip()
-                    buffer = ""
-                    if key and value:
-                        for selector in selectors:
-                            self.styles[selector][key] = value
-                elif char == "}":
-                    value = buffer.strip()
-                    buffer = ""
-                    if key and value:
-                        for selector in selectors:
-                            self.styles[selector][key] = value
-                    selectors.clear()
-                    key = ""
-                    value = ""
-                else:
-                    if char == '"' or char == "'":
-                        continue
-                    buffer += char
-            if buffer:
-                value = buffer.strip()
-                if key and value:
-                    for selector in selectors:
-                        self.styles[selector][key] = value
-                selectors.clear()
-                key = ""
-                value = ""
-                buffer = ""
+            for rule in tokenizer.feed(styles) + tokenizer.close():
+                self._add_rule(rule)
         except Exception as e:
             print("Error parsing external styles.", e)
 
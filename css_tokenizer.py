@@ -0,0 +1,219 @@
+import re
+
+
+class CSSTokenizer:
+    """
+    An incremental CSS tokenizer.
+
+    The stylesheet can be fed in chunks of any size (e.g. as it downloads).
+    Every style rule is returned by the `feed` (or `close`) call that completes it,
+    as a `(selectors, declarations, conditions)` tuple:
+      - `selectors`: the comma-separated selectors, whitespace-collapsed,
+      - `declarations`: `(name, value)` pairs in source order,
+      - `conditions`: the preludes of the at-rule blocks (e.g. `@media ...`)
+        the rule is nested in, outermost first.
+
+    Comments are skipped as they are read and quotes are removed from strings.
+    Statement at-rules (e.g. `@import`) and blocks nested in style rules are ignored.
+    """
+
+    SPECIAL_PATTERN = re.compile(r"[{};/\"']")
+    # a complete rule without comments, strings or nested blocks, read in one go
+    RULE_PATTERN = re.compile(r"([^{};/\"'@]+)\{([^{}/\"']*)\}")
+
+    def __init__(self):
+        self._buffer = ""
+        self._pieces = []  # text of the current prelude or declaration
+        self._selectors = None  # selectors of the rule being read (None outside rules)
+        self._declarations = []
+        self._conditions = []  # preludes of the enclosing at-rule blocks
+        self._skip_depth = 0  # depth inside an ignored block
+        self._closed = False
+
+    @classmethod
+    def parse_declarations(cls, text: str):
+        """
+        Tokenizes the body of a single rule, e.g. an inline `style` attribute.
+
+        :return: The `(name, value)` pairs in source order.
+        """
+        tokenizer = cls()
+        tokenizer._selectors = []
+        rules = tokenizer.feed(text) + tokenizer.close()
+        return rules[0][1] if rules else []
+
+    def feed(self, chunk: str):
+        """
+        Tokenizes the next `chunk` of the stylesheet. Tokens split across chunk
+        boundaries (e.g. comments or strings) are kept until the rest arrives.
+
+        :return: The rules completed by this chunk.
+        """
+        if self._closed:
+            raise ValueError("Cannot feed a closed CSSTokenizer.")
+        rules = []
+        if chunk:
+            self._buffer += chunk
+            consumed = self._consume(self._buffer, False, rules)
+            self._buffer = self._buffer[consumed:]
+        return rules
+
+    def close(self):
+        """
+        Tokenizes whatever is still buffered. A rule left open at the end
+        of the stylesheet is returned with the declarations read so far.
+
+        :return: The remaining rules.
+        """
+        if self._closed:
+            return []
+        self._closed = True
+        rules = []
+        self._consume(self._buffer, True, rules)
+        self._buffer = ""
+        if self._selectors is not None and not self._skip_depth:
+            self._end_rule(rules)
+        return rules
+
+    @staticmethod
+    def _split_selectors(prelude: str):
+        selectors = []
+        for selector in prelude.split(","):
+            selector = " ".join(selector.split())
+            if selector:
+                selectors.append(selector)
+        return selectors
+
+    @staticmethod
+    def _declaration(text: str):
+        """
+        :return: A `(name, value)` pair for the declaration `text`, or `None` if it is empty.
+        """
+        name, colon, value = text.partition(":")
+        name = name.strip()
+        value = " ".join(value.split())
+        if colon and name and value:
+            return (name, value)
+        return None
+
+    def _take_text(self):
+        text = " ".join("".join(self._pieces).split())
+        self._pieces.clear()
+        return text
+
+    def _consume(self, text: str, final: bool, rules: list):
+        """
+        Tokenizes `text` and returns the index up to which it was consumed.
+        """
+        search = self.SPECIAL_PATTERN.search
+        match_rule = self.RULE_PATTERN.match
+        pieces = self._pieces
+        length = len(text)
+        i = 0
+        while True:
+            if not pieces and self._selectors is None and not self._skip_depth:
+                match = match_rule(text, i)
+                if match is not None:
+                    selectors, body = match.groups()
+                    self._selectors = self._split_selectors(selectors)
+                    self._declarations = [
+                        declaration
+                        for declaration in map(self._declaration, body.split(";"))
+                        if declaration is not None
+                    ]
+                    self._end_rule(rules)
+                    i = match.end()
+                    continue
+
+            match = search(text, i)
+            if match is None:
+                if not self._skip_depth:
+                    pieces.append(text[i:])
+                return length
+
+            j = match.start()
+            char = text[j]
+            if j > i and not self._skip_depth:
+                piece = text[i:j]
+                # leading whitespace is insignificant
+                if pieces or not piece.isspace():
+                    pieces.append(piece)
+
+            if char == "/":
+                if j + 1 == length and not final:
+                    # can't tell whether a comment starts here yet
+                    return j
+                if text.startswith("*", j + 1):
+                    end = text.find("*/", j + 2)
+                    if end == -1:
+                        return length if final else j
+                    # a comment separates tokens like whitespace
+                    if pieces:
+                        pieces.append(" ")
+                    i = end + 2
+                else:
+                    pieces.append("/")
+                    i = j + 1
+                continue
+
+            if char == '"' or char == "'":
+                end = text.find(char, j + 1)
+                if end == -1:
+                    if not final:
+                        return j
+                    end = length
+                if not self._skip_depth:
+                    pieces.append(text[j + 1 : end])
+                i = end + 1
+                continue
+
+            i = j + 1
+            if self._skip_depth:
+                if char == "{":
+                    self._skip_depth += 1
+                elif char == "}":
+                    self._skip_depth -= 1
+            elif char == "{":
+                self._open_block()
+            elif char == "}":
+                self._close_block(rules)
+            else:
+                self._end_statement()
+
+    def _open_block(self):
+        prelude = self._take_text()
+        if self._selectors is not None:
+            # e.g. nested rules, which are not supported
+            self._skip_depth = 1
+        elif prelude.startswith("@"):
+            self._conditions.append(prelude)
+        else:
+            self._selectors = self._split_selectors(prelude)
+            self._declarations = []
+
+    def _close_block(self, rules: list):
+        if self._selectors is not None:
+            self._end_rule(rules)
+        else:
+            self._take_text()
+            if self._conditions:
+                self._conditions.pop()
+
+    def _end_statement(self):
+        if self._selectors is not None:
+            self._end_declaration()
+        else:
+            # statement at-rules such as `@import` or `@charset`
+            self._take_text()
+
+    def _end_declaration(self):
+        if self._pieces:
+            declaration = self._declaration(self._take_text())
+            if declaration is not None:
+                self._declarations.append(declaration)
+
+    def _end_rule(self, rules: list):
+        self._end_declaration()
+        rules.append((self._selectors, self._declarations, tuple(self._conditions)))
+        self._selectors = None
+        self._declarations = []
@@ -1,12 +1,33 @@
 import socket
 import ssl
 import os
-import gzip
+import zlib
+import codecs
 from datetime import datetime, timedelta, timezone
 
 
+class BodyDecoder:
+    """
+    Incrementally decodes (and un-gzips) a response body as it is read from the socket.
+    """
+
+    def __init__(self, gzipped: bool = False):
+        self.decompressor = (
+            zlib.decompressobj(16 + zlib.MAX_WBITS) if gzipped else None
+        )
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def decode(self, data: bytes, final: bool = False):
+        if self.decompressor is not None:
+            data = self.decompressor.decompress(data)
+            if final:
+                data += self.decompressor.flush()
+        return self.decoder.decode(data, final)
+
+
 class URL:
     SUPPORTED_SCHEMES = ("http", "https", "file", "data", "view-source", "about")
+    CHUNK_SIZE = 16 * 1024  # bytes read from the socket at a time
 
     def __init__(self, url: str):
         self.s = None  # socket
@@ -50,7 +71,14 @@ class URL:
         except Exception as e:
             print(f"Error parsing URL: {e}")
 
-    def request(self):
+    def request(self, on_chunk=None):
+        """
+        Fetch the resource.
+
+        :param on_chunk: Optional callback `on_chunk(text, content_type)` that receives
+            the decoded body piece by piece as it is read, e.g. to parse while downloading.
+        :return: A `(content, content_type)` tuple.
+        """
         try:
             if self.scheme == "http" or self.scheme == "https":
                 url = f"{self.scheme}://{self.host}:{self.port}{self.path}"
@@ -104,19 +132,34 @@ class URL:
                     name, value = line.split(":", 1)
                     responseHeaders[name.strip().casefold()] = value.strip()
 
-                if "content-length" in responseHeaders:
-                    contentLength = int(responseHeaders.get("content-length", 0))
-                    content = response.read(contentLength)
+                # stream the body to `on_chunk` unless it is a redirect page
+                contentType = responseHeaders.get("content-type", "")
+                stream = on_chunk if not (300 <= status < 400) else None
+                decoder = BodyDecoder(
+                    responseHeaders.get("content-encoding", "") == "gzip"
+                )
+                parts = []
+
+                def emit(data: bytes, final: bool = False):
+                    text = decoder.decode(data, final)
+                    if text:
+                        parts.append(text)
+                        if stream is not None:
+                            stream(text, contentType)
 
-                    if responseHeaders.get("content-encoding", "") == "gzip":
-                        content = gzip.decompress(content).decode("utf-8")
-                    else:
-                        content = content.decode("utf-8")
+                if "content-length" in responseHeaders:
+                    remaining = int(responseHeaders.get("content-length", 0))
+                    while remaining > 0:
+                        data = response.read(min(self.CHUNK_SIZE, remaining))
+                        if not data:
+                            break
+                        remaining -= len(data)
+                        emit(data)
+                    emit(b"", final=True)
                 elif (
                     "transfer-encoding" in responseHeaders
                     and responseHeaders.get("transfer-encoding", "") == "chunked"
                 ):
-                    content = ""
                     while True:
                         chunk = response.readline().strip()
                         if not chunk or chunk == b"0":
@@ -124,14 +167,11 @@ class URL:
                         chunkSize = int(chunk, 16)
                         if chunkSize == 0:
                             break
-                        chunkData = response.read(chunkSize)
-                        if responseHeaders.get("content-encoding", "") == "gzip":
-                            chunkData = gzip.decompress(chunkData).decode("utf-8")
-                        else:
-                            chunkData = chunkData.decode("utf-8")
-                        content += chunkData
-                else:
-                    content = ""
+                        emit(response.read(chunkSize))
+                        response.readline()  # CRLF after the chunk data
+                    emit(b"", final=True)
+
+                content = "".join(parts)
 
                 # redirects
                 if status >= 300 and status < 400:
@@ -143,7 +183,7 @@ class URL:
                             location = (
                                 f"{self.scheme}://{self.host}:{self.port}{location}"
                             )
-                        return URL(location).request()
+                        return URL(location).request(on_chunk)
 
                 if requestHeaders.get("Connection", "").lower() == "close":
                     self.s = self.s.close()
@@ -174,7 +214,7 @@ class URL:
                 return self.content, self.mediaType
             elif self.scheme == "view-source":
                 view_source_url = URL(self.url)
-                return view_source_url.request()
+                return view_source_url.request(on_chunk)
             elif self.scheme == "about":
                 if self.path == "blank":
                     return "<html><body></body></html>", "text/html"
@@ -1,11 +1,184 @@
+import weakref
+from collections import OrderedDict
 from tkinter import font as tk_font
 
 
+class FontMetrics:
+    """
+    Cached measurements of a single Tk font: the width of every word measured so far
+    (bounded, the oldest words are dropped first), the width of a space and the font metrics.
+
+    Lines are broken by adding up cached word widths instead of measuring each
+    growing line again, which would cost a Tcl call per word and quadratic time.
+    """
+
+    MAX_WORDS = 8192
+    # measures a list of words in a single Tcl evaluation, see `measure_words`
+    MEASURE_WORDS_SCRIPT = (
+        "{font words} {"
+        "set widths {}; "
+        "foreach word $words {lappend widths [font measure $font $word]}; "
+        "return $widths"
+        "}"
+    )
+
+    def __init__(self, font: tk_font.Font, max_words: int = MAX_WORDS):
+        # the font keeps its metrics (see `FontCache.metrics`), not the other way around
+        self._font = weakref.ref(font)
+        self.max_words = max_words
+        self.widths = {}
+        self.hits = 0
+        self.misses = 0
+        self._metrics = font.metrics()
+        self.linespace = self._metrics["linespace"]
+        self.space_width = font.measure(" ")
+
+    @property
+    def font(self):
+        return self._font()
+
+    def metrics(self, option: str = None):
+        """
+        Like `tkinter.font.Font.metrics`, without a Tcl call.
+        """
+        if option is not None:
+            return self._metrics[option]
+        return dict(self._metrics)
+
+    def measure(self, text: str):
+        """
+        :return: The width of `text` in pixels.
+        """
+        width = self.widths.get(text)
+        if width is not None:
+            self.hits += 1
+            return width
+
+        self.misses += 1
+        width = self.font.measure(text)
+        if len(self.widths) >= self.max_words:
+            del self.widths[next(iter(self.widths))]
+        self.widths[text] = width
+        return width
+
+    def measure_words(self, words):
+        """
+        Measures the `words` that are not cached yet, all in one Tcl evaluation
+        instead of one `font measure` call each, and caches their widths.
+
+        :return: The number of words measured.
+        """
+        widths = self.widths
+        missing = [word for word in dict.fromkeys(words) if word not in widths]
+        # don't evict words measured in this same batch
+        missing = missing[: self.max_words]
+        if not missing:
+            return 0
+
+        tk = getattr(self.font, "_tk", None)
+        if tk is None:
+            measured = [self.font.measure(word) for word in missing]
+        else:
+            result = tk.call(
+                "apply", self.MEASURE_WORDS_SCRIPT, self.font.name, tuple(missing)
+            )
+            measured = [int(width) for width in tk.splitlist(result)]
+
+        self.misses += len(missing)
+        overflow = len(widths) + len(missing) - self.max_words
+        if overflow > 0:
+            for word in list(widths)[:overflow]:
+                del widths[word]
+        widths.update(zip(missing, measured))
+        return len(missing)
+
+    def stats(self):
+        return {"words": len(self.widths), "hits": self.hits, "misses": self.misses}
+
+
+class FontCache:
+    """
+    A bounded LRU cache of Tk fonts, keyed by `(family, size, weight, slant, underline)`.
+
+    Every Tk font is a named font in the Tcl interpreter, so creating one per text run
+    is slow and piles up fonts. Evicted fonts are deleted by Tk once nothing uses them
+    anymore. The cached fonts are shared and must not be reconfigured.
+
+    Every font also keeps its `FontMetrics`, see `metrics`.
+    """
+
+    MAX_ENTRIES = 64
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        # `FontMetrics` of the cached fonts, by Tk font name (for `stats`)
+        self.font_metrics = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, family, size, weight, slant, underline=False):
+        """
+        :return: The Tk font with the given attributes, creating it only if it is not cached yet.
+        """
+        key = (family, size, weight, slant, bool(underline))
+        font = self.entries.get(key)
+        if font is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return font
+
+        self.misses += 1
+        font = tk_font.Font(
+            family=family, size=size, weight=weight, slant=slant, underline=underline
+        )
+        self.entries[key] = font
+        while len(self.entries) > self.max_entries:
+            _, evicted = self.entries.popitem(last=False)
+            self.font_metrics.pop(str(evicted), None)
+        return font
+
+    def metrics(self, font: tk_font.Font):
+        """
+        :return: The `FontMetrics` of `font`, stored on the font object itself,
+            so they last as long as the font, whether it is still cached or not.
+        """
+        metrics = getattr(font, "_font_metrics", None)
+        if metrics is None:
+            metrics = font._font_metrics = FontMetrics(font)
+            if any(cached is font for cached in self.entries.values()):
+                self.font_metrics[str(font)] = metrics
+        return metrics
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        word_hits = sum(metrics.hits for metrics in self.font_metrics.values())
+        word_misses = sum(metrics.misses for metrics in self.font_metrics.values())
+        word_lookups = word_hits + word_misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "word_hits": word_hits,
+            "word_misses": word_misses,
+            "word_hit_rate": word_hits / word_lookups if word_lookups else 0.0,
+        }
+
+    def clear(self):
+        self.entries.clear()
+        self.font_metrics.clear()
+        self.hits = self.misses = 0
+
+
 class Font:
     """
     A class to represent a font with various attributes such as family, size, weight, and slant.
     """
 
+    # Tk fonts shared by the whole process
+    CACHE = FontCache()
+
     def __init__(
         self, family="Times New Roman", size=14, weight="normal", slant="roman"
     ):
@@ -16,10 +189,10 @@ class Font:
         # print(tk_font.families())
 
     def get_font(self, new_style: dict = {}):
-        return tk_font.Font(
-            family=new_style["family"] if "family" in new_style else self.family,
-            size=new_style["size"] if "size" in new_style else self.size,
-            weight=new_style["weight"] if "weight" in new_style else self.weight,
-            slant=new_style["slant"] if "slant" in new_style else self.slant,
-            underline=new_style.get("underline", False),
+        return self.CACHE.get(
+            new_style["family"] if "family" in new_style else self.family,
+            new_style["size"] if "size" in new_style else self.size,
+            new_style["weight"] if "weight" in new_style else self.weight,
+            new_style["slant"] if "slant" in new_style else self.slant,
+            new_style.get("underline", False),
         )
@@ -1,11 +1,14 @@
-from nodes import Document, DocumentType, Element, Text, Comment
+from nodes import Document, DocumentType, Element, Text, SourceText, Comment
+from traversal import walk, SKIP, STOP
+from serializer import iter_tree
 import re
 
 
 # HTML Parser Class
 class HTMLParser:
-    DOCTYPE_PATTERN = r"(?i)^\s*<!doctype\s+html\s*>"
-    ATTRIBUTES_PATTERN = (
+    DOCTYPE_PATTERN = re.compile(r"(?i)\s*<!doctype\s+html\s*>")
+    NON_SPACE_PATTERN = re.compile(r"\S")
+    ATTRIBUTES_PATTERN = re.compile(
         r'([a-zA-Z][\w-]*)\s*(?:=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+)))?'
     )
     VOID_TAGS = [
@@ -24,39 +27,50 @@ class HTMLParser:
         "wbr",
     ]
 
-    def __init__(self, html: str):
-        self.html = html.strip()
+    def __init__(self, html: str = "", lazy_text: bool = False):
+        """
+        :param html: The document to `parse` (leave empty to `feed` it in chunks).
+        :param lazy_text: Create `SourceText` nodes that reference slices of the
+            source instead of normalized copies of their text. When the document
+            is fed in chunks, they reference the chunks (as buffered) instead.
+        """
+        self.html = html
+        self.lazy_text = lazy_text
         self.root = Document()
 
-        self.links = {
-            "css": [],
-            "js": [],
-            "a": [],
-            "img": [],
-        }
+        # incremental parsing state (see `feed` and `close`)
+        self._buffer = ""
+        self._current_node = self.root
+        self._open_nodes = []
+        self._doctype_checked = False
+        self._closed = False
+
+        # links are indexed on the document while parsing
+        self.links = self.root.links
 
     def extract_title(self, root=None):
         """
         Extract the title from the HTML content.
+        Documents built by this parser already have it in `Document.title`.
 
         :return: The title of the document or None if not found.
         """
 
-        def recurse(node):
-            if isinstance(node, Element) and node.tag == "title":
-                return node.children[0].text if node.children else None
+        if root is None:
+            return None
 
-            if isinstance(node, Document) or isinstance(node, Element):
-                for child in node.children:
-                    title = recurse(child)
-                    if title:
-                        return title
+        title = [None]
 
-            return None
+        def visit(node, depth):
+            if isinstance(node, Element) and node.tag == "title":
+                first = node.children[0] if node.children else None
+                if isinstance(first, Text) and first.text:
+                    title[0] = first.text
+                    return STOP
+                return SKIP
 
-        if root is None:
-            return None
-        return recurse(root)
+        walk(root, pre=visit)
+        return title[0]
 
     def _add_link(self, link_type: str, href: str):
         """
@@ -72,53 +86,63 @@ class HTMLParser:
 
     def extract_links(self, root=None):
         """
-        Recursively extract links from the HTML document.
-        Currently supports: css, anchor (a), and image (img) links.
+        Extract links from the HTML document.
+        Currently supports: css, js, anchor (a), and image (img) links.
+        Documents built by this parser are indexed while parsing (see `Document.links`),
+        so this is only needed for trees built by other means.
 
         :param root: The root element of the HTML document.
         :type root: Document or Element
         """
-        if root is None:
-            return
-
-        if isinstance(root, Element):
-            if root.tag == "link" and root.attributes.get("rel") == "stylesheet":
-                href = root.attributes.get("href")
-                if href:
-                    self._add_link("css", href)
 
-            elif root.tag == "script" and root.attributes.get("src"):
-                href = root.attributes.get("src")
-                if href:
-                    self._add_link("js", href)
+        def visit(node, depth):
+            if isinstance(node, Element):
+                self._collect_links(node)
 
-            elif root.tag == "a":
-                href = root.attributes.get("href")
-                if href:
-                    self._add_link("a", href)
+        walk(root, pre=visit)
 
-            elif root.tag == "img":
-                href = root.attributes.get("src")
+    def _collect_links(self, element: Element):
+        """
+        Adds the reference held by `element` (if any) to `self.links`.
+        """
+        tag = element.tag
+        if tag == "link":
+            if element.attributes.get("rel") == "stylesheet":
+                href = element.attributes.get("href")
                 if href:
-                    self._add_link("img", href)
-
-        if isinstance(root, Document) or isinstance(root, Element):
-            for child in root.children:
-                self.extract_links(child)
+                    self._add_link("css", href)
+        elif tag == "script":
+            href = element.attributes.get("src")
+            if href:
+                self._add_link("js", href)
+        elif tag == "a":
+            href = element.attributes.get("href")
+            if href:
+                self._add_link("a", href)
+        elif tag == "img":
+            href = element.attributes.get("src")
+            if href:
+                self._add_link("img", href)
 
     def _handle_doctype(self, html: str, current_node):
-        if re.match(self.DOCTYPE_PATTERN, html):
+        """
+        :return: The index in `html` where the content after the doctype starts.
+        """
+        match = self.DOCTYPE_PATTERN.match(html)
+        if match:
             current_node.add_child(DocumentType(current_node))
-            html = re.sub(self.DOCTYPE_PATTERN, "", html, count=1).strip()
-        return html
+            return match.end()
+        return 0
 
     def _handle_comment(self, content: str, html: str, i: int, j: int, current_node):
         if content.endswith("--"):
             comment_text = content[3:-2].strip()
         else:
-            j = html.find("-->", j + 1)
-            comment_text = html[i + 4 : j].strip()
-            j += 2
+            end = html.find("-->", j + 1)
+            if end == -1:
+                end = len(html)
+            comment_text = self._format_text(html[i + 4 : end])
+            j = end + 2
         current_node.add_child(Comment(comment_text, current_node))
         return j
 
@@ -136,173 +160,249 @@ class HTMLParser:
                 current_node = current_node.parent
         return current_node, open_nodes
 
+    def _index_element(self, element: Element):
+        """
+        Records a newly created element and its references in the document index.
+        """
+        self.root.index_element(element)
+        self._collect_links(element)
+
+    def _create_element(self, content: str, current_node, selfClosing: bool = False):
+        # `content` is whitespace-collapsed, so one space separates the tag name
+        tag_name, _, attrs = content.partition(" ")
+        new_element = Element(tag_name.lower(), current_node, selfClosing)
+        if attrs:
+            for name, value in self._parse_attributes(attrs):
+                new_element.set_attribute(name, value)
+        current_node.add_child(new_element)
+        self._index_element(new_element)
+        return new_element
+
     def _handle_self_closing_tag(self, content: str, current_node):
         content = content[:-1].strip()
-        attributes = []
-        if content.find(" ") != -1:
-            parts = content.strip().split(None, 1)
-            tag_name = parts[0]
-            if len(parts) > 1:
-                attrs = parts[1]
-                attributes = self._parse_attributes(attrs)
-        else:
-            tag_name = content
-        new_element = Element(tag_name.strip().lower(), current_node, True)
-        for name, value in attributes:
-            new_element.set_attribute(name, value)
-        current_node.add_child(new_element)
+        self._create_element(content, current_node, True)
         return content, current_node
 
     def _parse_attributes(self, attr_string: str):
         attributes = []
 
-        for match in re.finditer(self.ATTRIBUTES_PATTERN, attr_string):
+        for match in self.ATTRIBUTES_PATTERN.finditer(attr_string):
             name = match.group(1).strip().lower()
             value = match.group(2) or match.group(3) or match.group(4) or ""
             attributes.append((name, value))
 
         return attributes
 
+    def _raw_text_end(self, content: str):
+        """
+        Returns the closing tag that ends the raw text of a `<style>` or inline
+        `<script>` element opened by `content`, or `None` for any other tag.
+        """
+        if content.startswith("style"):
+            return "</style>"
+        if content.startswith("script") and "src" not in content:
+            return "</script>"
+        return None
+
     def _handle_opening_tag(
         self, content: str, html: str, current_node, j: int, open_nodes: list
     ):
-        # style tags
-        if content.startswith("style"):
-            j = html.find("</style>", j + 1)
-            j += len("/style>")
-        # script tags
-        elif content.startswith("script") and "src" not in content:
-            j = html.find("</script>", j + 1)
-            j += len("/script>")
+        raw_text_end = self._raw_text_end(content)
+        # style tags and inline script tags
+        if raw_text_end is not None:
+            end = html.find(raw_text_end, j + 1)
+            if end == -1:
+                end = len(html)
+            j = end + len(raw_text_end) - 1
         else:
-            attributes = []
-            if content.find(" ") != -1:
-                parts = content.strip().split(None, 1)
-                tag_name = parts[0]
-                if len(parts) > 1:
-                    attrs = parts[1]
-                    attributes = self._parse_attributes(attrs)
-            else:
-                tag_name = content
-            if tag_name.strip().lower() in self.VOID_TAGS:
-                content, current_node = self._handle_self_closing_tag(
-                    content, current_node
-                )
+            tag_name = content.partition(" ")[0].lower()
+            if tag_name in self.VOID_TAGS:
+                self._create_element(content, current_node, True)
                 return current_node, j, open_nodes
-            new_element = Element(tag_name.strip().lower(), current_node)
-            current_node.add_child(new_element)
-            open_nodes.append(tag_name.strip().lower())
-            current_node = new_element
-            for name, value in attributes:
-                new_element.set_attribute(name, value)
+            current_node = self._create_element(content, current_node)
+            open_nodes.append(tag_name)
         return current_node, j, open_nodes
 
+    def _is_complete(self, content: str, html: str, j: int):
+        """
+        Checks whether the markup starting with the tag `content` (ending at `j`)
+        is fully contained in `html`, i.e. comments and raw text elements have
+        their terminators.
+        """
+        if content.startswith("!--"):
+            return content.endswith("--") or html.find("-->", j + 1) != -1
+        raw_text_end = self._raw_text_end(content)
+        if raw_text_end is not None:
+            return html.find(raw_text_end, j + 1) != -1
+        return True
+
+    def _add_text(self, html: str, start: int, end: int):
+        """
+        Adds the text run `html[start:end]` to the current node (unless it is blank).
+        """
+        current_node = self._current_node
+        if self.lazy_text:
+            if self.NON_SPACE_PATTERN.search(html, start, end) is None:
+                return
+            text_node = SourceText(html, start, end, current_node)
+        else:
+            text_content = self._format_text(html[start:end])
+            if not text_content:
+                return
+            text_node = Text(text_content, current_node)
+
+        # the first <title> text becomes the document title
+        if (
+            self.root.title is None
+            and isinstance(current_node, Element)
+            and current_node.tag == "title"
+            and not current_node.children
+        ):
+            self.root.title = text_node.text
+        current_node.add_child(text_node)
+
+    def _consume(self, html: str, start: int, final: bool):
+        """
+        Tokenizes as much of `html` as possible and adds the resulting nodes to the tree.
+        The tokenizer jumps from one `<` to the next `>` with `str.find` and slices
+        the text runs in between in one step.
+
+        :param html: The buffered, not yet parsed markup.
+        :param start: The index in `html` to start at.
+        :param final: Whether no more input will follow. If not, incomplete markup
+            (and a trailing text run that may continue) is left unconsumed.
+        :return: The index of the first unconsumed character.
+        """
+        find = html.find
+        text_start = start
+        i = find("<", start)
+        while i != -1:
+            j = find(">", i)
+            if j == -1:
+                if not final:
+                    return text_start
+                # no tag can follow, so each remaining `<` just starts a new text run
+                while i != -1:
+                    self._add_text(html, text_start, i)
+                    text_start = i
+                    i = find("<", i + 1)
+                break
+
+            _content = self._format_text(html[i + 1 : j])
+            if not final and not self._is_complete(_content, html, j):
+                return text_start
+
+            if text_start < i:
+                self._add_text(html, text_start, i)
+
+            current_node = self._current_node
+            # comments
+            if _content.startswith("!--"):
+                j = self._handle_comment(_content, html, i, j, current_node)
+            # closing tags
+            elif _content.startswith("/"):
+                current_node, self._open_nodes = self._handle_closing_tag(
+                    self._open_nodes, _content, current_node
+                )
+            # self-closing tags
+            elif _content.endswith("/"):
+                _content, current_node = self._handle_self_closing_tag(
+                    _content, current_node
+                )
+            # opening tags
+            else:
+                current_node, j, self._open_nodes = self._handle_opening_tag(
+                    _content, html, current_node, j, self._open_nodes
+                )
+            self._current_node = current_node
+
+            text_start = j + 1
+            i = find("<", text_start)
+
+        if not final:
+            return text_start
+
+        self._add_text(html, text_start, len(html))
+        return len(html)
+
+    def feed(self, chunk: str):
+        """
+        Parses the next `chunk` of the document, growing the tree rooted at `self.root`.
+        Markup split across chunk boundaries is kept until the rest of it arrives.
+
+        :param chunk: The next piece of the HTML document.
+        """
+        if self._closed:
+            raise ValueError("Cannot feed a closed HTMLParser.")
+        if not chunk:
+            return
+
+        self._buffer += chunk
+        start = 0
+
+        # DOCTYPE (only valid at the start of the document)
+        if not self._doctype_checked:
+            head = self.NON_SPACE_PATTERN.search(self._buffer)
+            if head is None or (
+                self._buffer.startswith("<", head.start())
+                and self._buffer.find(">", head.start()) == -1
+            ):
+                return
+            start = self._handle_doctype(self._buffer, self.root)
+            self._doctype_checked = True
+
+        consumed = self._consume(self._buffer, start, final=False)
+        self._buffer = self._buffer[consumed:]
+
+    def close(self):
+        """
+        Parses whatever is still buffered and closes all open elements.
+
+        :return: The root of the document tree.
+        """
+        if self._closed:
+            return self.root
+        self._closed = True
+
+        start = 0
+        if not self._doctype_checked:
+            start = self._handle_doctype(self._buffer, self.root)
+            self._doctype_checked = True
+
+        self._consume(self._buffer, start, final=True)
+        self._buffer = ""
+
+        while len(self._open_nodes):
+            self._open_nodes.pop()
+            self._current_node = self._current_node.parent
+
+        return self.root
+
     def parse(self):
         html = self.html
-        if not html:
+        if not html or html.isspace():
             print("No HTML content to parse.")
             return self.root
 
-        current_node = self.root
-
-        # DOCTYPE
-        html = self._handle_doctype(html, current_node)
-
-        # format HTML
-        html = self._format_text(html)
-
-        open_nodes = []
-
-        i = 0
-        buffer = ""
-        while i < len(html):
-            char = html[i]
-
-            if char == "<":
-                if buffer:
-                    text_content = buffer.strip()
-                    if text_content:
-                        text_content = self._format_text(text_content)
-                        new_element = Text(text_content, current_node)
-                        current_node.add_child(new_element)
-                buffer = ""
-
-                j = html.find(">", i)
-                if j == -1:
-                    buffer += char
-                    i += 1
-                    continue
-
-                _content = html[i + 1 : j].strip()
-
-                # comments
-                if _content.startswith("!--"):
-                    j = self._handle_comment(_content, html, i, j, current_node)
-                # closing tags
-                elif _content.startswith("/"):
-                    current_node, open_nodes = self._handle_closing_tag(
-                        open_nodes, _content, current_node
-                    )
-                # self-closing tags
-                elif _content.endswith("/"):
-                    _content, current_node = self._handle_self_closing_tag(
-                        _content, current_node
-                    )
-                # opening tags
-                else:
-                    current_node, j, open_nodes = self._handle_opening_tag(
-                        _content, html, current_node, j, open_nodes
-                    )
-
-                i = j + 1
-                continue
-
-            i += 1
-            buffer += char
-
-        if buffer:
-            text_content = buffer.strip()
-            if text_content:
-                text_content = self._format_text(text_content)
-                new_element = Text(text_content, current_node)
-                current_node.add_child(new_element)
-
-        while len(open_nodes):
-            open_nodes.pop()
-            current_node = current_node.parent
-
-        return self.root
+        # the whole document is available, so there is nothing to hold back
+        self._buffer = html
+        return self.close()
 
     def _format_text(self, text: str):
-        # Replace newline followed by non-whitespace character with space
-        text = re.sub(r"\n(?=\S)", " ", text)
         # Collapse all consecutive whitespace (space, tab, newline) into a single space
-        text = re.sub(r"\s+", " ", text).strip()
-        return text
+        return " ".join(text.split())
 
 
 def print_tree(start_node=None, indent=0, log=True):
     if start_node is None:
         return
 
-    text = [""]
-
-    def recurse(node, lst, indent=0):
-        txt = " " * indent + " "
-        if isinstance(node, Element):
-            txt += node.tag
-        elif isinstance(node, Text):
-            txt += node.text
+    lines = []
+    for line in iter_tree(start_node, indent):
         if log:
-            print(txt)
-        lst[0] += txt + "\n"
-
-        if isinstance(node, Document) or isinstance(node, Element):
-            for child in node.children:
-                recurse(child, lst, indent + 2)
-
-    recurse(start_node, text, indent)
-    return text[0]
+            print(line, end="")
+        lines.append(line)
+    return "".join(lines)
 
 
 if __name__ == "__main__":
@@ -1,8 +1,11 @@
 from nodes import Document, DocumentType, Element, Text, Comment
 from tkinter.font import Font as tk_Font
 from draw import DrawText, DrawRect
-from css_parser import CSSParser
+from stylesheet import Stylesheet
+from computed_style import ComputedStyle, StyleSharingCache, resolve_style_steps
+from traversal import SKIP, STOP, walk, walk_steps
 from font import Font
+import line_breaker
 
 
 class LayoutNode:
@@ -34,11 +37,30 @@ class LayoutNode:
         self.children.append(child)
 
 
+class LineBox:
+    """
+    A line of text laid out: the text span, its position, width and font.
+    """
+
+    __slots__ = ("text", "x", "y", "width", "font")
+
+    def __init__(self, text: str, x: int, y: int, width: int, font: tk_Font):
+        self.text = text
+        self.x = x
+        self.y = y
+        self.width = width
+        self.font = font
+
+
 class TextNode(LayoutNode):
     """
     Represents a text node in the layout tree.
     Each text node corresponds to a Text object and contains its position,
-    size, and parent node.
+    size, parent node and the line boxes its text was broken into.
+
+    It also keeps the intrinsic sizes of its text (the words and their widths),
+    so it can be laid out for another width without measuring anything, and
+    the range of widths its current line breaks are valid for.
     """
 
     def __init__(
@@ -52,6 +74,82 @@ class TextNode(LayoutNode):
     ):
         super().__init__(x, y, width, height, parent, name)
         self.font = Font().get_font()
+        self.lines = []  # `LineBox`es, set by `Layout.layout`
+        self.words = []
+        self.widths = []
+        self.space_width = 0
+        self.linespace = 0
+        # the line breaks stay the same for widths in [low, high)
+        self.break_range = (float("-inf"), float("inf"))
+
+    def set_words(self, words: list, metrics):
+        """
+        Sets the words of the text, measured with the `FontMetrics` of its font.
+        """
+        self.words = words
+        self.widths = [metrics.measure(word) for word in words]
+        self.space_width = metrics.space_width
+        self.linespace = metrics.linespace
+
+    def break_lines(self, max_width: int):
+        """
+        Breaks the words into line boxes no wider than `max_width` (unless a word is),
+        placed at the node's position, and sets the node's height.
+        """
+        words = self.words
+        widths = self.widths
+        space_width = self.space_width
+        starts = line_breaker.break_positions(widths, space_width, max_width)
+        starts.append(len(words))
+
+        self.lines = []
+        low, high = float("-inf"), float("inf")
+        y = self.y
+        for start, end in zip(starts, starts[1:]):
+            width = sum(widths[start:end]) + space_width * (end - start - 1)
+            self.lines.append(
+                LineBox(" ".join(words[start:end]), self.x, y, width, self.font)
+            )
+            y += self.linespace
+            # narrower, the line would not fit; wider, the next word would
+            if end - start > 1:
+                low = max(low, width)
+            if end < len(words):
+                high = min(high, width + space_width + widths[end])
+        self.break_range = (low, high)
+        self.height = y - self.y
+
+    def copy_text(self, source, dx: int = 0, dy: int = 0):
+        """
+        Takes the text layout of `source`, a text node with the same text and font,
+        with its line boxes moved by `(dx, dy)`.
+        """
+        self.font = source.font
+        self.words = source.words
+        self.widths = source.widths
+        self.space_width = source.space_width
+        self.linespace = source.linespace
+        self.break_range = source.break_range
+        self.lines = [
+            LineBox(line.text, line.x + dx, line.y + dy, line.width, line.font)
+            for line in source.lines
+        ]
+
+    def reflow(self, max_width: int):
+        """
+        Lays out the lines for `max_width` at the node's current position,
+        breaking them again only if the line breaks change.
+
+        :return: Whether the lines were broken again.
+        """
+        low, high = self.break_range
+        if low <= max_width < high:
+            for index, line in enumerate(self.lines):
+                line.x = self.x
+                line.y = self.y + index * self.linespace
+            return False
+        self.break_lines(max_width)
+        return True
 
 
 class Layout:
@@ -62,13 +160,9 @@ class Layout:
     """
 
     HSTEP, VSTEP = 13, 18
-    INHERITED_STYLE_PROPERTIES = [
-        "color",
-        "font-size",
-        "font-family",
-        "font-weight",
-        "font-style",
-    ]
+    INHERITED_STYLE_PROPERTIES = ComputedStyle.INHERITED_PROPERTIES
+    # lazy layout prepares the subtrees it gets to in runs of about this many nodes
+    LAZY_PREPARE_NODES = 512
 
     def __init__(self, screen_width: int, screen_height: int):
         self.node = None
@@ -77,100 +171,435 @@ class Layout:
         self.display_list = []
         self.cursor_x = self.HSTEP
         self.cursor_y = self.VSTEP
+        # text nodes broken again and only moved by the last `reflow`
+        self.reflowed = 0
+        self.moved = 0
+        # subtrees copied from an identical one and laid out by the last `layout`
+        self.memo_hits = 0
+        self.memo_misses = 0
+        # styles resolved by a lazy `layout_steps`, for their statistics
+        self.style_sharing = None
+        # bottom of the content laid out so far, see `estimated_height`
+        self.laid_out_y = 0
+        self._parents = []
+        self._cursors = []
+        self._rects = []
+        self._open = 0
+        self._children = None
+        self._child_lists = {}
+        self._child_counts = {}
 
     def layout(self, node=None, styles={}):
         """
         Builds the layout tree from the given `node`.
+
+        :param styles: The page's `Stylesheet` or `Cascade` (or a `{selector: declarations}` dict)
+            to resolve the styles of the elements with first. Pass `None` if the styles
+            were already resolved with `computed_style.resolve_styles`.
         """
+        for _ in self.layout_steps(node, styles, batch=0):
+            pass
 
-        def recurse(node, prev=None):
-            if node is None:
-                return
+    def layout_steps(self, node=None, styles={}, batch: int = 32, lazy: bool = False):
+        """
+        Generator version of `layout` that yields after every `batch` nodes.
 
+        :param lazy: Lay out the document front to back in one pass: styles are resolved,
+            words measured and draw commands added as the layout gets to them, instead
+            of for the whole document up front. The content above `laid_out_y` is final
+            (and can be painted) long before the rest is laid out, see `estimated_height`.
+        """
+        style_sharing = None
+        if styles is not None:
+            stylesheet = styles
+            if isinstance(stylesheet, dict):
+                stylesheet = Stylesheet.from_styles(styles)
+            if lazy:
+                style_sharing = StyleSharingCache(stylesheet)
+            else:
+                yield from resolve_style_steps(node, stylesheet, batch)
+        self.style_sharing = style_sharing
+
+        # layout node of the element at each depth of the current path
+        parents = []
+        # running block cursor of each of those elements: the height of
+        # the children laid out so far, i.e. where the next child goes
+        cursors = []
+        # index of the next child of each of those elements
+        positions = []
+        # lazy layout: the `DrawRect` of each of those elements
+        rects = []
+
+        def children(node):
+            if isinstance(node, Document) or isinstance(node, Element):
+                # Skip the doctype and the head tag
+                return [
+                    child
+                    for child in node.children
+                    if not isinstance(child, DocumentType)
+                    and not (isinstance(child, Element) and child.tag == "head")
+                ]
+            return None
+
+        self.laid_out_y = 0
+        self._parents = parents
+        self._cursors = cursors
+        self._rects = rects
+        self._open = 0
+        self._children = children
+        self._child_counts = {}
+
+        keys = {}
+        signatures = {}
+        styled = set()
+
+        def share_style(element):
+            if element not in styled:
+                styled.add(element)
+                parent = element.parent
+                parent_style = (
+                    parent.computed_style if isinstance(parent, Element) else None
+                )
+                element.computed_style = style_sharing.style_for(element, parent_style)
+
+        resolve_style = share_style if style_sharing is not None else None
+
+        if not lazy:
+            yield from self._prepare_steps([node], children, keys, signatures, batch=batch)
+        # children of the nodes being laid out without having been prepared
+        child_lists = {}
+        self._child_lists = child_lists
+
+        def layout_children(node):
+            kids = children(node)
+            if lazy and keys.get(node) is None:
+                child_lists[node] = kids
+            return kids
+
+        def prepare(node, depth):
+            # prepare the subtree of `node` and the following siblings, as far as they go
+            if depth > 0:
+                siblings = child_lists[node.parent]
+                index = positions[depth - 1] - 1
+                nodes = (siblings[i] for i in range(index, len(siblings)))
+            else:
+                nodes = [node]
+            for _ in self._prepare_steps(
+                nodes,
+                children,
+                keys,
+                signatures,
+                resolve_style,
+                limit=self.LAZY_PREPARE_NODES,
+                batch=0,
+            ):
+                pass
+
+        # laid out subtrees by (structure, width), see `_prepare_steps`
+        memo = {}
+        self.memo_hits = self.memo_misses = 0
+
+        def enter(node, depth):
+            prev = parents[depth - 1] if depth > 0 else None
             new_node = None
+            rect = None
+            if depth > 0:
+                positions[depth - 1] += 1
+            if lazy and node not in keys:
+                if isinstance(node, Element) or isinstance(node, Text):
+                    prepare(node, depth)
 
             if isinstance(node, Element):
+                self._open = depth + 1
                 new_node = LayoutNode(
                     0, 0, self.SCREEN_WIDTH, self.SCREEN_HEIGHT, None, node.tag
                 )
-                # assign external styles to the node
-                node.styles.update(styles.get(node.tag, {}))
                 new_node.node = node
                 if prev is not None:
-                    ch = 0
-                    for child in prev.children:
-                        ch += child.height
                     prev.add_child(new_node)
                     new_node.parent = prev
                     new_node.x = prev.x
-                    new_node.y = prev.y + ch
+                    new_node.y = prev.y + cursors[depth - 1]
                     new_node.width = prev.width
+                    self.laid_out_y = new_node.y
+
+                    # reuse the layout of an identical subtree laid out before
+                    key = keys.get(node)
+                    source = memo.get((key, new_node.width)) if key is not None else None
+                    if source is not None:
+                        self.memo_hits += 1
+                        self._copy_subtree(source, new_node, children)
+                        if lazy:
+                            first = len(self.display_list)
+                            walk(new_node, pre=lambda node, depth: self._render_node(node))
+                            rects[depth:] = [self.display_list[first]]
+                        parents[depth:] = [new_node]
+                        cursors[depth:] = [source.height]
+                        positions[depth:] = [0]
+                        self.laid_out_y = new_node.y + new_node.height
+                        return SKIP
+                    self.memo_misses += 1
                 else:
                     self.node = new_node
+                if lazy:
+                    # the height is only known once all the children are laid out
+                    self._render_node(new_node)
+                    rect = self.display_list[-1]
             elif isinstance(node, Text):
                 new_node = TextNode(
                     0, 0, self.SCREEN_WIDTH, self.SCREEN_HEIGHT, None, node.text
                 )
                 new_node.node = node
                 if prev is not None:
-                    ch = 0
-                    for child in prev.children:
-                        ch += child.height
                     prev.add_child(new_node)
                     new_node.parent = prev
                     new_node.x = prev.x
-                    new_node.y = prev.y + ch
+                    new_node.y = prev.y + cursors[depth - 1]
                     new_node.width = prev.width
 
-                    external_styles = node.parent.styles
-                    css_parser = CSSParser()
-                    text_styles = css_parser.extract_text_styles(external_styles)
-                    new_node.font = Font().get_font(text_styles)
-
-                    # Calculate height based on text content
-                    h = 0
-                    text = ""
-                    for word in node.text.split():
-                        if text:
-                            test_line = text + " " + word
-                        else:
-                            test_line = word
-                        text_width = new_node.font.measure(test_line)
-                        if text_width > self.SCREEN_WIDTH - self.HSTEP:
-                            h += new_node.font.metrics()["linespace"]
-                            text = word
-                        else:
-                            text = test_line
-                    if text:
-                        h += new_node.font.metrics()["linespace"]
-
-                    new_node.height = h
-
-            if isinstance(node, Document) or isinstance(node, Element):
-                for child in node.children:
-                    if isinstance(child, DocumentType):
-                        continue
-                    if isinstance(child, Element):
-                        # Inherit styles from parent element
-                        if isinstance(node, Element):
-                            parent_styles = node.styles
-                            for key in parent_styles:
-                                if key in self.INHERITED_STYLE_PROPERTIES:
-                                    child.styles.update(parent_styles)
-
-                        # Skip the head tag while recursing
-                        if child.tag == "head":
-                            continue
-                    recurse(child, new_node)
+                    style = getattr(node.parent, "computed_style", None)
+                    if style is not None:
+                        new_node.font = Font().get_font(style.text_style)
 
+                    # break the text into line boxes, which make up its height
+                    new_node.set_words(
+                        node.text.split(), Font.CACHE.metrics(new_node.font)
+                    )
+                    new_node.break_lines(self.SCREEN_WIDTH - self.HSTEP)
+                    cursors[depth - 1] += new_node.height
+                    self.laid_out_y = new_node.y + new_node.height
+                    if lazy:
+                        self._render_node(new_node)
+
+            parents[depth:] = [new_node]
+            cursors[depth:] = [0]
+            positions[depth:] = [0]
+            if lazy:
+                rects[depth:] = [rect]
+
+        def leave(node, depth):
+            if lazy:
+                child_lists.pop(node, None)
             if isinstance(node, Element):
+                self._open = depth
+                new_node = parents[depth]
                 if new_node is not None:
-                    h = 0
-                    for child in new_node.children:
-                        h += child.height
-                    new_node.height = h
+                    new_node.height = cursors[depth]
+                    self.laid_out_y = new_node.y + new_node.height
+                    if lazy:
+                        rects[depth].height = new_node.height
+                    if new_node.parent is not None:
+                        cursors[depth - 1] += new_node.height
+                        key = keys.get(node)
+                        if key is not None:
+                            memo.setdefault((key, new_node.width), new_node)
+
+        yield from walk_steps(
+            node, pre=enter, post=leave, children=layout_children, batch=batch
+        )
+        self._open = 0
+        self._parents = self._cursors = self._rects = []
+        self._child_lists = {}
+        self._child_counts = {}
+
+    def estimated_height(self):
+        """
+        The height of the document laid out by `layout_steps`, exact once it is done.
+        While a lazy layout is in progress, every element still being laid out is
+        estimated to be as high as the average of its children laid out so far, times
+        its number of children, and its `DrawRect` is stretched to that height.
+
+        :return: The height in pixels.
+        """
+        estimate = None  # of the element still being laid out at the depth below
+        for depth in range(self._open - 1, -1, -1):
+            node = self._parents[depth]
+            if node is None:
+                continue
+            height = self._cursors[depth] + (estimate or 0)
+            placed = len(node.children)
+            if placed:
+                count = self._child_counts.get(node)
+                if count is None:
+                    kids = self._child_lists.get(node.node)
+                    if kids is None:
+                        kids = self._children(node.node)
+                    count = self._child_counts[node] = len(kids)
+                height += height / placed * max(count - placed, 0)
+            estimate = height
+            if depth < len(self._rects):
+                self._rects[depth].height = height
+        if estimate is None:
+            return self.node.height if self.node is not None else 0
+        return int(estimate)
+
+    def _copy_subtree(self, source: LayoutNode, target: LayoutNode, children):
+        """
+        Fills the layout node `target` of an element with a copy of the children of
+        `source`, the layout of a structurally identical element, moved to `target`'s
+        position. The copies refer to the DOM nodes below `target.node`.
+        """
+        dx = target.x - source.x
+        dy = target.y - source.y
+        target.height = source.height
+        stack = [(source, target)]
+        while stack:
+            source, target = stack.pop()
+            dom_children = [
+                child
+                for child in children(target.node)
+                if isinstance(child, Element) or isinstance(child, Text)
+            ]
+            for source_child, dom_child in zip(source.children, dom_children):
+                if isinstance(source_child, TextNode):
+                    child = TextNode(
+                        source_child.x + dx,
+                        source_child.y + dy,
+                        source_child.width,
+                        source_child.height,
+                        target,
+                        source_child.name,
+                    )
+                    child.copy_text(source_child, dx, dy)
+                else:
+                    child = LayoutNode(
+                        source_child.x + dx,
+                        source_child.y + dy,
+                        source_child.width,
+                        source_child.height,
+                        target,
+                        source_child.name,
+                    )
+                    stack.append((source_child, child))
+                child.node = dom_child
+                target.add_child(child)
 
-        recurse(node)
+    def reflow(self, screen_width: int, screen_height: int):
+        """
+        Lays out the layout tree built by `layout` again for a new screen size,
+        see `reflow_steps`.
+        """
+        for _ in self.reflow_steps(screen_width, screen_height, batch=0):
+            pass
+
+    def reflow_steps(self, screen_width: int, screen_height: int, batch: int = 32):
+        """
+        Lays out the existing layout tree for a new screen size in one pass, without
+        going back to the DOM or measuring text: text nodes only break their lines
+        again if the breaks change (see `TextNode.reflow`), everything else just
+        moves. Yields after every `batch` layout nodes.
+
+        The display list is cleared, call `render` afterwards.
+        """
+        self.SCREEN_WIDTH = screen_width
+        self.SCREEN_HEIGHT = screen_height
+        self.display_list = []
+        self.reflowed = self.moved = 0
+        max_width = screen_width - self.HSTEP
+        cursors = []
+
+        def enter(node, depth):
+            parent = node.parent
+            if parent is None:
+                node.width = screen_width
+            else:
+                node.x = parent.x
+                node.y = parent.y + cursors[depth - 1]
+                node.width = parent.width
+            cursors[depth:] = [0]
+            if isinstance(node, TextNode):
+                if node.reflow(max_width):
+                    self.reflowed += 1
+                else:
+                    self.moved += 1
+                if parent is not None:
+                    cursors[depth - 1] += node.height
+
+        def leave(node, depth):
+            if not isinstance(node, TextNode):
+                node.height = cursors[depth]
+                if node.parent is not None:
+                    cursors[depth - 1] += node.height
+
+        yield from walk_steps(self.node, pre=enter, post=leave, batch=batch)
+
+    def _prepare_steps(
+        self,
+        nodes,
+        children,
+        keys: dict,
+        signatures: dict,
+        resolve_style=None,
+        limit: int = 0,
+        batch: int = 32,
+    ):
+        """
+        Walks the subtrees of `nodes` before laying them out, to:
+          - resolve the styles of their elements with `resolve_style`, if given,
+          - measure all the words of their text up front, in one batch per font,
+            so that line breaking only looks up cached widths,
+          - give every node a key for the structure of its subtree (tags, text
+            and computed styles): elements with the same key lay out the same.
+
+        :param keys: The keys of the nodes prepared so far, as a `{node: key}` dict.
+            Their subtrees are skipped, the new keys are added.
+        :param signatures: The key of every distinct subtree signature seen so far.
+        :param limit: Stop after this many nodes (0 for no limit). The elements whose
+            subtree was not walked completely are prepared, but keyed `None`.
+        """
+        fonts = {}  # metrics of the font of each (shared) computed style
+        words = {}  # words to measure by font metrics
+        visited = 0
+
+        def enter(node, depth):
+            nonlocal visited
+            if node in keys:
+                return SKIP
+            visited += 1
+            if isinstance(node, Element):
+                if resolve_style is not None:
+                    resolve_style(node)
+                keys[node] = None  # until its subtree is done
+                # don't even start on a subtree too big to finish
+                if limit and visited + len(node.children) > limit:
+                    return STOP
+            elif isinstance(node, Text):
+                if limit and visited > limit:
+                    return STOP
+                style = getattr(node.parent, "computed_style", None)
+                metrics = fonts.get(style)
+                if metrics is None:
+                    if style is not None:
+                        font = Font().get_font(style.text_style)
+                    else:
+                        font = Font().get_font()
+                    metrics = fonts[style] = Font.CACHE.metrics(font)
+                text = node.text
+                words.setdefault(metrics, set()).update(text.split())
+                keys[node] = signatures.setdefault(("#text", text), len(signatures))
+
+        def leave(node, depth):
+            if isinstance(node, Element) and keys[node] is None:
+                signature = (
+                    node.tag,
+                    node.computed_style,
+                    tuple(keys[child] for child in children(node) if child in keys),
+                )
+                keys[node] = signatures.setdefault(signature, len(signatures))
+
+        for node in nodes:
+            if limit and visited >= limit:
+                break
+            if node in keys:
+                # prepared before, but counts towards the limit as well
+                visited += 1
+                continue
+            yield from walk_steps(
+                node, pre=enter, post=leave, children=children, batch=batch
+            )
+        for metrics, font_words in words.items():
+            metrics.measure_words(font_words)
+            yield
 
     def _update_source_view_display_list(
         self, text: str, x: int, color: str, font: tk_Font
@@ -181,28 +610,29 @@ class Layout:
         if not text:
             return
 
+        metrics = Font.CACHE.metrics(font)
         self.cursor_x = x
         buffer = ""
         for i, char in enumerate(text):
             if char == "\n":
                 self.cursor_x = x
-                self.cursor_y += font.metrics()["linespace"] + self.VSTEP
+                self.cursor_y += metrics.linespace + self.VSTEP
             elif char == " ":
                 if buffer:
                     self.display_list.append(
                         DrawText(self.cursor_x, self.cursor_y, buffer, font, color)
                     )
-                    self.cursor_x += font.measure(buffer)
+                    self.cursor_x += metrics.measure(buffer)
                     j = text.find(" ", i + 1)
                     if j != -1:
                         next_word = text[i + 1 : j]
-                        next_word_width = font.measure(next_word)
+                        next_word_width = metrics.measure(next_word)
                         if self.cursor_x + next_word_width > self.SCREEN_WIDTH:
                             self.cursor_x = x
-                            self.cursor_y += font.metrics()["linespace"] + self.VSTEP
+                            self.cursor_y += metrics.linespace + self.VSTEP
                     buffer = ""
                 if i < 1 or text[i - 1] != " ":
-                    self.cursor_x += font.measure(" ")
+                    self.cursor_x += metrics.space_width
             else:
                 buffer += char
         if buffer:
@@ -214,9 +644,21 @@ class Layout:
         """
         Computes the `display_list` for viewing the `HTML` source code in a formatted way.
         """
-        if root is None:
-            return
-
+        walk(
+            root,
+            pre=lambda node, depth: self._source_view_open(
+                font, node, indent + depth * self.HSTEP
+            ),
+            post=lambda node, depth: self._source_view_close(
+                font, node, indent + depth * self.HSTEP
+            ),
+        )
+
+    def _source_view_open(self, font: tk_Font, root, indent: int):
+        """
+        Adds the doctype, opening tag, comment or text of `root` to the source view.
+        """
+        metrics = Font.CACHE.metrics(font)
         # DOCTYPE
         if isinstance(root, DocumentType):
             text = f"<!"
@@ -224,14 +666,14 @@ class Layout:
             self._update_source_view_display_list(text, indent, "white", font)
             text = "DOCTYPE "
             self._update_source_view_display_list(
-                text, indent + font.measure(prev_text), "red", font
+                text, indent + metrics.measure(prev_text), "red", font
             )
             prev_text += text
             text = "HTML>"
             self._update_source_view_display_list(
-                text, indent + font.measure(prev_text), "white", font
+                text, indent + metrics.measure(prev_text), "white", font
             )
-            self.cursor_y += font.metrics()["linespace"] + self.VSTEP
+            self.cursor_y += metrics.linespace + self.VSTEP
         # opening tags
         elif isinstance(root, Element):
             text = f"<"
@@ -239,31 +681,31 @@ class Layout:
             self._update_source_view_display_list(text, indent, "white", font)
             text = f"{root.tag}"
             self._update_source_view_display_list(
-                text, indent + font.measure(prev_text), "red", font
+                text, indent + metrics.measure(prev_text), "red", font
             )
             # attributes
             for name, value in root.attributes.items():
                 prev_text += text
                 text = f" {name}="
                 self._update_source_view_display_list(
-                    text, indent + font.measure(prev_text), "green", font
+                    text, indent + metrics.measure(prev_text), "green", font
                 )
                 prev_text += text
                 text = f'"{value}"'
                 self._update_source_view_display_list(
-                    text, indent + font.measure(prev_text), "yellow", font
+                    text, indent + metrics.measure(prev_text), "yellow", font
                 )
             prev_text += text
             text = f"{' /' if root.selfClosing else ''}>"
             self._update_source_view_display_list(
-                text, indent + font.measure(prev_text), "white", font
+                text, indent + metrics.measure(prev_text), "white", font
             )
-            self.cursor_y += font.metrics()["linespace"] + self.VSTEP
+            self.cursor_y += metrics.linespace + self.VSTEP
         # comments
         elif isinstance(root, Comment):
             text = f"<!-- {root.comment} -->"
             self._update_source_view_display_list(text, indent, "gray", font)
-            self.cursor_y += font.metrics()["linespace"] + self.VSTEP
+            self.cursor_y += metrics.linespace + self.VSTEP
 
         # text
         if isinstance(root, Text):
@@ -272,13 +714,13 @@ class Layout:
             else:
                 text = root.text
                 self._update_source_view_display_list(text, indent, "white", font)
-                self.cursor_y += font.metrics()["linespace"] + self.VSTEP
-
-        # recurse children
-        if isinstance(root, Document) or isinstance(root, Element):
-            for child in root.children:
-                self.source_view(font, child, indent + self.HSTEP)
+                self.cursor_y += metrics.linespace + self.VSTEP
 
+    def _source_view_close(self, font: tk_Font, root, indent: int):
+        """
+        Adds the closing tag of `root` to the source view.
+        """
+        metrics = Font.CACHE.metrics(font)
         # closing tags
         if isinstance(root, Element):
             if not root.selfClosing:
@@ -287,19 +729,20 @@ class Layout:
                 self._update_source_view_display_list(text, indent, "white", font)
                 text = f"{root.tag}"
                 self._update_source_view_display_list(
-                    text, indent + font.measure(prev_text), "red", font
+                    text, indent + metrics.measure(prev_text), "red", font
                 )
                 prev_text += text
                 text = f">"
                 self._update_source_view_display_list(
-                    text, indent + font.measure(prev_text), "white", font
+                    text, indent + metrics.measure(prev_text), "white", font
                 )
-                self.cursor_y += font.metrics()["linespace"] + self.VSTEP
+                self.cursor_y += metrics.linespace + self.VSTEP
 
     def file_view(self, text: str, font: tk_Font):
         """
         Compute the `display_list` for viewing `file` content in a simple text format.
         """
+        metrics = Font.CACHE.metrics(font)
         cursor_x, cursor_y = self.HSTEP, self.VSTEP
         for c in text:
             if c == "\n":
@@ -309,7 +752,7 @@ class Layout:
             cursor_x += self.HSTEP
             if cursor_x > self.SCREEN_WIDTH - self.HSTEP:
                 cursor_x = self.HSTEP
-                cursor_y += font.metrics()["linespace"] + self.VSTEP
+                cursor_y += metrics.linespace + self.VSTEP
 
     def render(self, root=None):
         """
@@ -320,20 +763,25 @@ class Layout:
         **Note:**
         Call the `layout` method to build the layout tree and then call this method to populate the display list.
         """
+        for _ in self.render_steps(root, batch=0):
+            pass
+
+    def render_steps(self, root=None, batch: int = 32):
+        """
+        Generator version of `render` that yields after every `batch` layout nodes,
+        with the display list filled up to that point.
+        """
+        yield from walk_steps(
+            root, pre=lambda node, depth: self._render_node(node), batch=batch
+        )
+
+    def _render_node(self, root):
+        """
+        Adds the draw commands of a single layout node to the display list.
+        """
         if root.node is not None:
             if isinstance(root.node, Element):
-                external_styles = root.node.styles
-                styles = {}
-                if "style" in root.node.attributes:
-                    inline_styles = root.node.attributes["style"]
-                    css_parser = CSSParser()
-                    css_parser.parse(inline_styles=inline_styles)
-                    styles = css_parser.styles
-
-                bgColor = styles.get("background-color", "transparent")
-                if bgColor == "transparent":
-                    bgColor = external_styles.get("background-color", "transparent")
-
+                style = root.node.computed_style
                 self.display_list.append(
                     DrawRect(
                         root.x,
@@ -341,73 +789,29 @@ class Layout:
                         root.width,
                         root.height,
                         border="white",
-                        backgound=bgColor if bgColor != "transparent" else "white",
+                        backgound=style.background_color if style else "white",
                     )
                 )
             elif isinstance(root.node, Text):
-                styles = {}
-                external_styles = root.node.parent.styles
-                if "style" in root.node.parent.attributes:
-                    inline_styles = root.node.parent.attributes["style"]
-                    css_parser = CSSParser()
-                    css_parser.parse(inline_styles=inline_styles)
-                    styles = css_parser.styles
-
-                textColor = styles.get("color", "transparent")
-                if textColor == "transparent":
-                    textColor = external_styles.get("color", "transparent")
-
-                font = root.font
-
-                # break the text into lines based on the width
-                text = ""
-                cursor_y = root.y
-                for word in root.node.text.split():
-                    if text:
-                        test_line = text + " " + word
-                    else:
-                        test_line = word
-                    text_width = font.measure(test_line)
-                    if text_width > self.SCREEN_WIDTH - self.HSTEP:
-                        self.display_list.append(
-                            DrawText(
-                                root.x,
-                                cursor_y,
-                                text,
-                                font,
-                                textColor if textColor != "transparent" else "black",
-                            )
-                        )
-                        cursor_y += font.metrics()["linespace"]
-                        text = word
-                    else:
-                        text = test_line
-                if text:
+                style = getattr(root.node.parent, "computed_style", None)
+                textColor = style.color if style else "black"
+
+                # the lines were broken and placed by `layout`
+                for line in root.lines:
                     self.display_list.append(
-                        DrawText(
-                            root.x,
-                            cursor_y,
-                            text,
-                            font,
-                            textColor if textColor != "transparent" else "black",
-                        )
+                        DrawText(line.x, line.y, line.text, line.font, textColor)
                     )
 
-        for child in root.children:
-            self.render(child)
-
 
 def print_layout_tree(node=None, indent=0):
     """
     Prints the layout tree structure for debugging purposes.
     """
-    if node is None:
-        return
 
-    print(
-        " " * indent
-        + f"'{node.name}' ({node.x}, {node.y}, {node.width}, {node.height})"
-    )
+    def visit(node, depth):
+        print(
+            " " * (indent + 2 * depth)
+            + f"'{node.name}' ({node.x}, {node.y}, {node.width}, {node.height})"
+        )
 
-    for child in node.children:
-        print_layout_tree(child, indent + 2)
+    walk(node, pre=visit)
@@ -0,0 +1,76 @@
+"""
+Greedy line breaking over arrays of word widths.
+
+A line holds as many words as fit in the available width, a word wider than
+that gets a line of its own. With the prefix sums `ends[k]` of `width + space`
+over the first `k` words, the words `i..j-1` fit on a line exactly when
+`ends[j] <= ends[i] + max_width + space`, so the end of the line starting at
+every word can be found with a binary search. NumPy (if installed) does all of
+these searches at once; the pure-Python fallback gives identical results.
+"""
+
+from bisect import bisect_right
+from itertools import accumulate
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# below this many words converting the widths to an array costs more than it saves
+NUMPY_MIN_WORDS = 1000
+
+
+def break_positions(widths, space_width, max_width, use_numpy=None):
+    """
+    Computes where greedy line breaking breaks a run of words.
+
+    :param widths: The widths of the words, in order.
+    :param space_width: The width of the space between two words on a line.
+    :param max_width: The width available for a line.
+    :param use_numpy: Whether to use NumPy, by default if installed and there are enough words.
+    :return: The index of the first word of every line.
+    """
+    count = len(widths)
+    if count == 0:
+        return []
+    if use_numpy is None:
+        use_numpy = np is not None and count >= NUMPY_MIN_WORDS
+    if use_numpy:
+        return _break_positions_numpy(widths, space_width, max_width)
+    return _break_positions_python(widths, space_width, max_width)
+
+
+def _break_positions_python(widths, space_width, max_width):
+    ends = [0]
+    ends.extend(accumulate(width + space_width for width in widths))
+    limit = max_width + space_width
+    count = len(widths)
+    starts = []
+    start = 0
+    while start < count:
+        starts.append(start)
+        end = bisect_right(ends, ends[start] + limit, start + 1) - 1
+        start = max(end, start + 1)
+    return starts
+
+
+def _break_positions_numpy(widths, space_width, max_width):
+    count = len(widths)
+    # float64 holds integer widths exactly, so the sums compare like the Python ones
+    ends = np.zeros(count + 1)
+    np.cumsum(np.fromiter(widths, float, count) + space_width, out=ends[1:])
+    # the end of the line starting at each word (at least that word itself)
+    line_ends = np.searchsorted(ends, ends[:-1] + (max_width + space_width), "right")
+    line_ends -= 1
+    np.maximum(line_ends, np.arange(1, count + 1), out=line_ends)
+
+    # only the lines starting after a break matter, follow them from the first word
+    next_starts = memoryview(line_ends.astype(np.int64, copy=False))
+    starts = []
+    start = 0
+    while start < count:
+        starts.append(start)
+        start = next_starts[start]
+    return starts
+
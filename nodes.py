@@ -1,17 +1,88 @@
+import sys
+from types import MappingProxyType
+
+# Shared read-only mapping returned for elements without attributes/styles,
+# so that such elements don't allocate dicts of their own.
+EMPTY_MAPPING = MappingProxyType({})
+
+
 # Root Node
 class Document:
     def __init__(self):
         self.children = []
+        # index filled in by the parser while it builds the tree
+        self.title = None  # text of the first <title>
+        self.links = {
+            "css": [],
+            "js": [],
+            "a": [],
+            "img": [],
+        }
+        # element lookup indexes, kept up to date through `index_element`
+        self._elements = []  # all elements in document order
+        self._by_tag = {}  # tag -> [elements]
+        self._by_id = {}  # id -> first element with that id
+        self._by_class = {}  # class name -> [elements]
 
     def add_child(self, child):
         self.children.append(child)
 
+    def index_element(self, element):
+        """
+        Adds an element (with its attributes already set) to the lookup indexes.
+        Elements must be indexed in document order.
+        """
+        self._elements.append(element)
+        self._by_tag.setdefault(element.tag, []).append(element)
+        attributes = element.attributes
+        element_id = attributes.get("id")
+        if element_id:
+            self._by_id.setdefault(element_id, element)
+        class_names = attributes.get("class")
+        if class_names:
+            for class_name in set(class_names.split()):
+                self._by_class.setdefault(class_name, []).append(element)
+
+    def get_element_by_id(self, element_id: str):
+        """
+        :return: The first element with the given `id`, or `None`.
+        """
+        return self._by_id.get(element_id)
+
+    def get_elements_by_tag_name(self, tag: str):
+        """
+        :return: The elements with the given tag name (`*` for all) in document order.
+        """
+        if tag == "*":
+            return list(self._elements)
+        return list(self._by_tag.get(tag.lower(), ()))
+
+    def get_elements_by_class_name(self, class_names: str):
+        """
+        :param class_names: One or more space-separated class names.
+        :return: The elements that have all of the given classes, in document order.
+        """
+        names = set(class_names.split())
+        if not names:
+            return []
+        buckets = [self._by_class.get(name, ()) for name in names]
+        smallest = min(buckets, key=len)
+        if len(names) == 1:
+            return list(smallest)
+        return [
+            element
+            for element in smallest
+            if names.issubset(element.attributes["class"].split())
+        ]
+
     def __str__(self):
         return f"<ROOT>"
 
 
 # <!DOCTYPE HTML>
 class DocumentType:
+    __slots__ = ("parent",)
+
     def __init__(self, parent=None):
         self.parent = parent
 
@@ -21,26 +92,57 @@ class DocumentType:
 
 # Element Node
 class Element:
+    # Tag and attribute names are interned, and the attribute dict
+    # is only allocated once something is stored in it.
+    __slots__ = (
+        "tag",
+        "children",
+        "parent",
+        "selfClosing",
+        "_attributes",
+        "computed_style",
+    )
+
     def __init__(self, tag: str, parent=None, selfClosing: bool = False):
-        self.tag = tag
+        self.tag = sys.intern(tag)
         self.children = []
         self.parent = parent
-        self.attributes = {}
         self.selfClosing = selfClosing
-        self.styles = {} # external styles
+        self._attributes = None
+        self.computed_style = None  # set by `computed_style.resolve_styles`
+
+    @property
+    def attributes(self):
+        """
+        The element's attributes (read-only, use `set_attribute` to change them).
+        """
+        return self._attributes if self._attributes is not None else EMPTY_MAPPING
+
+    @property
+    def styles(self):
+        """
+        The element's computed style properties (read-only, empty until styles are resolved).
+        """
+        if self.computed_style is None:
+            return EMPTY_MAPPING
+        return self.computed_style.properties
 
     def set_attribute(self, name: str, value: str):
-        self.attributes[name] = value
+        if self._attributes is None:
+            self._attributes = {}
+        self._attributes[sys.intern(name)] = value
 
     def add_child(self, child):
         self.children.append(child)
 
     def __str__(self):
-        return f"<{self.tag}> Attributes: {self.attributes} Childrens: {len(self.children)}"
+        return f"<{self.tag}> Attributes: {dict(self.attributes)} Childrens: {len(self.children)}"
 
 
 # Text Node
 class Text:
+    __slots__ = ("text", "parent")
+
     def __init__(self, text: str, parent=None):
         self.text = text
         self.parent = parent
@@ -49,8 +151,58 @@ class Text:
         return f"{self.text}"
 
 
+# storage of `Text.text`, reused by `SourceText` to cache its normalized text
+TEXT_SLOT = Text.text
+
+
+# Text Node referencing a slice of the source document
+class SourceText(Text):
+    """
+    A text node that keeps an offset and length into the source document instead
+    of its own copy of the text. Whitespace is only normalized (and the slice
+    copied) the first time `text` is read.
+
+    The source is whatever string the parser read the text from: for a document
+    fed in chunks that is the parser's buffer at the time, not the whole document,
+    so the text stays in those chunk buffers until it is read.
+    """
+
+    __slots__ = ("_source", "_start", "_length")
+
+    def __init__(self, source: str, start: int, end: int, parent=None):
+        self._source = source
+        self._start = start
+        self._length = end - start
+        self.parent = parent
+
+    @property
+    def text(self):
+        if self._source is not None:
+            source = self._source[self._start : self._start + self._length]
+            # keep the normalized text in the `Text.text` slot from now on
+            TEXT_SLOT.__set__(self, " ".join(source.split()))
+            self._source = None
+        return TEXT_SLOT.__get__(self, SourceText)
+
+    @text.setter
+    def text(self, text: str):
+        TEXT_SLOT.__set__(self, text)
+        self._source = None
+
+    def source_text(self):
+        """
+        :return: The text as it is in the source (without normalizing it),
+            or `None` if `text` was read or set already.
+        """
+        if self._source is None:
+            return None
+        return self._source[self._start : self._start + self._length]
+
+
 # Comment Node
 class Comment:
+    __slots__ = ("comment", "parent")
+
     def __init__(self, comment: str, parent=None):
         self.comment = comment
         self.parent = parent
@@ -0,0 +1,260 @@
+import os
+import json
+import zlib
+import hashlib
+from collections import OrderedDict
+from nodes import Document, DocumentType, Element, Text, SourceText, Comment
+from html_parser import HTMLParser
+
+# Serialized node kinds. A document is stored as a flat list of pre-order
+# operations; `END` closes the most recently opened element. `SOURCE_TEXT` is
+# a `SourceText` that was not read yet, stored as a slice of the document's source.
+ELEMENT, END, TEXT, COMMENT, DOCTYPE, SOURCE_TEXT = range(6)
+
+
+def serialize(document: Document):
+    """
+    Flattens a document tree into a compact tuple of plain values
+    that can be stored as JSON and turned back into a tree with `deserialize`.
+    """
+    steps = serialize_steps(document, batch=0)
+    while True:
+        try:
+            next(steps)
+        except StopIteration as stop:
+            return stop.value
+
+
+def serialize_steps(document: Document, batch: int = 256):
+    """
+    Generator version of `serialize` that yields after every `batch` nodes
+    (and returns the serialized document). A `batch` of 0 never yields.
+
+    Text nodes whose text was not read yet are not normalized: their source is
+    stored as is and they are lazy again once deserialized.
+    """
+    ops = []
+    source = []  # the source of the unread text nodes
+    length = 0
+    stack = [document]
+    visited = 0
+    while stack:
+        node = stack.pop()
+        if batch:
+            visited += 1
+            if visited == batch:
+                visited = 0
+                yield
+        if node is END:
+            ops.append((END,))
+        elif isinstance(node, Element):
+            attributes = tuple(node.attributes.items()) or None
+            ops.append((ELEMENT, node.tag, attributes, node.selfClosing))
+            stack.append(END)
+            stack.extend(reversed(node.children))
+        elif isinstance(node, Text):
+            text = node.source_text() if isinstance(node, SourceText) else None
+            if text is None:
+                ops.append((TEXT, node.text))
+            else:
+                ops.append((SOURCE_TEXT, length, len(text)))
+                source.append(text)
+                length += len(text)
+        elif isinstance(node, Comment):
+            ops.append((COMMENT, node.comment))
+        elif isinstance(node, DocumentType):
+            ops.append((DOCTYPE,))
+        elif isinstance(node, Document):
+            stack.extend(reversed(node.children))
+    links = tuple((kind, tuple(hrefs)) for kind, hrefs in document.links.items())
+    return (document.title, links, tuple(ops), "".join(source))
+
+
+def deserialize(data):
+    """
+    Builds a new document tree (with its title, links and lookup indexes)
+    from the output of `serialize`.
+    """
+    title, links, ops, source = data
+    document = Document()
+    document.title = title
+    for kind, hrefs in links:
+        document.links[kind] = list(hrefs)
+
+    current = document
+    for op in ops:
+        kind = op[0]
+        if kind == ELEMENT:
+            element = Element(op[1], current, op[3])
+            if op[2]:
+                for name, value in op[2]:
+                    element.set_attribute(name, value)
+            current.add_child(element)
+            document.index_element(element)
+            current = element
+        elif kind == END:
+            current = current.parent
+        elif kind == TEXT:
+            current.add_child(Text(op[1], current))
+        elif kind == SOURCE_TEXT:
+            current.add_child(SourceText(source, op[1], op[1] + op[2], current))
+        elif kind == COMMENT:
+            current.add_child(Comment(op[1], current))
+        elif kind == DOCTYPE:
+            current.add_child(DocumentType(current))
+    return document
+
+
+class ParseCache:
+    """
+    A bounded LRU cache of parsed HTML documents, keyed by a hash of the source.
+
+    Documents are stored in their serialized form, so every lookup returns a
+    fresh tree that can be styled and laid out without affecting other users.
+    If `cache_dir` is given, entries are also kept on disk between sessions,
+    as compressed JSON so that reading them never runs code.
+
+    The URLs documents were cached for are remembered as well, so that a page
+    that is loaded again can be looked up before it is parsed (see `remembers`).
+    """
+
+    MAX_ENTRIES = 32
+    # bump whenever the parser or the serialized format changes
+    FORMAT_VERSION = 3
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, cache_dir: str = None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.entries = OrderedDict()
+        self.urls = OrderedDict()  # url -> key of the document last cached for it
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.cache_dir is not None:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+            except Exception as e:
+                print(f"An error occurred while creating the parse cache directory: {e}")
+                self.cache_dir = None
+
+    def key(self, html: str):
+        digest = hashlib.blake2b(html.encode("utf-8"), digest_size=16)
+        return f"{self.FORMAT_VERSION}-{digest.hexdigest()}"
+
+    def _path(self, key: str):
+        return os.path.join(self.cache_dir, f"{key}.dom")
+
+    def _remember(self, key: str, data):
+        self.entries[key] = data
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _load_from_disk(self, key: str):
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self._path(key), "rb") as file:
+                return json.loads(zlib.decompress(file.read()).decode("utf-8"))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"An error occurred while reading the parse cache: {e}")
+            return None
+
+    def _save_to_disk(self, key: str, data):
+        if self.cache_dir is None:
+            return
+        try:
+            payload = zlib.compress(
+                json.dumps(data, separators=(",", ":")).encode("utf-8")
+            )
+            with open(self._path(key), "wb") as file:
+                file.write(payload)
+        except Exception as e:
+            print(f"An error occurred while writing the parse cache: {e}")
+
+    def get(self, html: str):
+        """
+        :return: A fresh copy of the cached document for `html`, or `None`.
+        """
+        key = self.key(html)
+        data = self.entries.get(key)
+        if data is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return deserialize(data)
+        data = self._load_from_disk(key)
+        if data is not None:
+            self._remember(key, data)
+            self.disk_hits += 1
+            return deserialize(data)
+        self.misses += 1
+        return None
+
+    def remembers(self, url: str):
+        """
+        :return: Whether the document last cached for `url` is still cached,
+            i.e. whether a new load of `url` is worth looking up before parsing.
+        """
+        key = self.urls.get(url)
+        if key is None:
+            return False
+        if key in self.entries:
+            return True
+        return self.cache_dir is not None and os.path.exists(self._path(key))
+
+    def put(self, html: str, document: Document, url: str = None):
+        """
+        Caches `document` as the parse result of `html`.
+        Later changes to `document` do not affect the cache.
+
+        :param url: The URL `html` was loaded from, remembered for `remembers`.
+        """
+        for _ in self.put_steps(html, document, url, batch=0):
+            pass
+
+    def put_steps(self, html: str, document: Document, url: str = None, batch: int = 256):
+        """
+        Generator version of `put` that yields after every `batch` serialized nodes.
+        """
+        key = self.key(html)
+        if url is not None:
+            self.urls[url] = key
+            self.urls.move_to_end(url)
+            while len(self.urls) > self.max_entries:
+                self.urls.popitem(last=False)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return
+        data = yield from serialize_steps(document, batch)
+        self._remember(key, data)
+        self._save_to_disk(key, data)
+
+    def parse(self, html: str, lazy_text: bool = False):
+        """
+        Returns the document tree for `html`, running the parser only on a cache miss.
+
+        :param lazy_text: Passed on to `HTMLParser` on a miss.
+        """
+        document = self.get(html)
+        if document is None:
+            document = HTMLParser(html, lazy_text).parse()
+            self.put(html, document)
+        return document
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        self.entries.clear()
+        self.urls.clear()
+        self.hits = self.disk_hits = self.misses = 0
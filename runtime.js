@@ -21,8 +21,29 @@ window = {
   },
 
   document: {
-    tree: function () {
-      call_python("print_document_tree");
+    tree: function (page) {
+      return call_python("print_document_tree", page);
+    },
+    outerHTML: function (page) {
+      return call_python("print_outer_html", page);
+    },
+    text: function (page) {
+      return call_python("print_text", page);
+    },
+    getElementById: function (id) {
+      return call_python("get_element_by_id", id);
+    },
+    getElementsByTagName: function (tag) {
+      return call_python("get_elements_by_tag_name", tag);
+    },
+    getElementsByClassName: function (names) {
+      return call_python("get_elements_by_class_name", names);
+    },
+  },
+
+  parseCache: {
+    stats: function () {
+      call_python("print_parse_cache_stats");
     },
   },
 };
@@ -0,0 +1,160 @@
+import time
+import traceback
+
+
+class Scheduler:
+    """
+    Runs a generator task cooperatively on the Tk event loop, in time slices of
+    about `slice_ms` milliseconds, so the window keeps handling input between them.
+
+    The task yields after every small unit of work:
+      - `None` to let the scheduler check whether the slice is used up,
+      - a string to start a new stage of the timeline (e.g. "parse", "layout"),
+      - `Scheduler.WAIT` when it has nothing to do until something else happens
+        (e.g. more data arrives), which ends the slice early.
+    """
+
+    SLICE_MS = 8
+    # how long to wait before resuming a task that yielded `WAIT`
+    WAIT_MS = 10
+    WAIT = object()
+
+    def __init__(self, widget, slice_ms: int = SLICE_MS, on_slice=None):
+        """
+        :param widget: Any Tk widget, used for `after` and `after_cancel`.
+        :param on_slice: Called after every slice, e.g. to paint partial results.
+        """
+        self.widget = widget
+        self.slice_ms = slice_ms
+        self.on_slice = on_slice
+        self.name = ""
+        self.task = None
+        self.on_done = None
+        # stages of the current (or last) task, in the order they started
+        self.timeline = []
+        self.slices = 0
+        self.longest_slice = 0.0
+        self._started = 0.0
+        self._finished = None
+        self._after_id = None
+
+    @property
+    def running(self):
+        return self.task is not None
+
+    def run(self, task, name: str = "task", on_done=None):
+        """
+        Starts running `task`, cancelling the task that is currently running.
+
+        :param on_done: Called once the task has completed.
+        """
+        self.cancel()
+        self.task = task
+        self.name = name
+        self.on_done = on_done
+        self.timeline = []
+        self.slices = 0
+        self.longest_slice = 0.0
+        self._started = time.perf_counter()
+        self._finished = None
+        self._after_id = self.widget.after(1, self._run_slice)
+
+    def cancel(self):
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+        if self.task is not None:
+            self.task.close()
+            self.task = None
+            self._begin_stage("cancelled", time.perf_counter())
+            self._finished = time.perf_counter()
+
+    def _begin_stage(self, stage: str, now: float):
+        self.timeline.append(
+            {
+                "stage": stage,
+                "start": (now - self._started) * 1000,
+                "busy": 0.0,
+                "slices": 0,
+            }
+        )
+
+    def _account(self, start: float, end: float, counted: bool):
+        """
+        Adds the time between `start` and `end` to the current stage.
+
+        :param counted: Whether this slice was already counted for the stage.
+        """
+        if not self.timeline:
+            self._begin_stage(self.name, start)
+        entry = self.timeline[-1]
+        entry["busy"] += (end - start) * 1000
+        if not counted:
+            entry["slices"] += 1
+
+    def _run_slice(self):
+        self._after_id = None
+        start = mark = time.perf_counter()
+        deadline = start + self.slice_ms / 1000
+        counted = False
+        delay = 1
+        done = False
+
+        try:
+            while True:
+                step = next(self.task)
+                now = time.perf_counter()
+                if step is self.WAIT:
+                    delay = self.WAIT_MS
+                    break
+                if isinstance(step, str):
+                    if self.timeline:
+                        self._account(mark, now, counted)
+                    self._begin_stage(step, now)
+                    mark = now
+                    counted = False
+                if now >= deadline:
+                    break
+        except StopIteration:
+            done = True
+        except Exception as e:
+            print(f"An error occurred while running {self.name}: {e}")
+            traceback.print_exc()
+            self.task = None
+            self._begin_stage("error", time.perf_counter())
+            self._finished = time.perf_counter()
+            return
+
+        end = time.perf_counter()
+        self._account(mark, end, counted)
+        self.slices += 1
+        self.longest_slice = max(self.longest_slice, (end - start) * 1000)
+
+        if done:
+            self.task = None
+            self._finished = end
+
+        if self.on_slice is not None:
+            self.on_slice()
+
+        if done:
+            if self.on_done is not None:
+                self.on_done()
+        else:
+            self._after_id = self.widget.after(delay, self._run_slice)
+
+    def format_timeline(self):
+        """
+        :return: The timeline of the current (or last) task as text, one line per stage.
+        """
+        finished = self._finished if self._finished is not None else time.perf_counter()
+        lines = [
+            f"{self.name}: {(finished - self._started) * 1000:.1f} ms, "
+            f"{self.slices} slices (longest {self.longest_slice:.1f} ms)"
+        ]
+        for entry in self.timeline:
+            lines.append(
+                f"  {entry['stage']:<10} at {entry['start']:8.1f} ms, "
+                f"busy {entry['busy']:7.1f} ms in {entry['slices']} slices"
+            )
+        return "\n".join(lines)
@@ -262,7 +262,13 @@ class Scrollbar:
 
         canvas.config(cursor=cursor)
 
-    def calc_max_scroll(self, display_list: list, font: font.Font):
+    def calc_max_scroll(
+        self, display_list: list, font: font.Font, content_height: int = None
+    ):
+        """
+        :param content_height: The (estimated) height of content that is not
+            all in `display_list` yet, e.g. while the page is being laid out.
+        """
         effective_height = self.SCREEN_HEIGHT - (
             self.SCROLLBAR_WIDTH if self.MAX_H_SCROLL > 0 else 0
         )
@@ -278,6 +284,10 @@ class Scrollbar:
                 else 0
             ),
         )
+        if content_height is not None:
+            self.MAX_V_SCROLL = max(self.MAX_V_SCROLL, content_height - effective_height)
+        # e.g. the estimated height of the content was too high
+        self.v_scroll = min(self.v_scroll, self.MAX_V_SCROLL)
         self.MAX_H_SCROLL = max(
             0,
             (
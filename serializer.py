@@ -0,0 +1,167 @@
+"""
+Streaming serializers for the DOM tree.
+
+Each serializer is a generator of string pieces in document order, so callers
+can write them straight to a file, join them once, or cut them into pages
+(see `Pager`) without ever building the output by repeated concatenation.
+"""
+
+from nodes import DocumentType, Element, Text, Comment
+from traversal import Visitor, walk_steps
+
+
+def _walk(root, enter, leave=None):
+    """
+    Walks the tree below `root` and yields the pieces that the `enter(node, depth, out)`
+    and `leave(node, depth, out)` hooks append to `out`, a few nodes at a time.
+    """
+    out = []
+    visitor = Visitor()
+    visitor.enter = lambda node, depth: enter(node, depth, out)
+    if leave is not None:
+        visitor.leave = lambda node, depth: leave(node, depth, out)
+    for _ in walk_steps(root, visitor):
+        yield from out
+        out.clear()
+    yield from out
+
+
+def _attributes(element: Element):
+    parts = []
+    for name, value in element.attributes.items():
+        quote = "'" if '"' in value else '"'
+        parts.append(f" {name}={quote}{value}{quote}")
+    return "".join(parts)
+
+
+def iter_outer_html(root):
+    """
+    Yields the HTML source of `root` and its descendants (the `outerHTML` of an element,
+    the whole document for a `Document`). Text is written as it was parsed.
+    """
+
+    def enter(node, depth, out):
+        if isinstance(node, Element):
+            if node.selfClosing:
+                out.append(f"<{node.tag}{_attributes(node)} />")
+            else:
+                out.append(f"<{node.tag}{_attributes(node)}>")
+        elif isinstance(node, Text):
+            out.append(node.text)
+        elif isinstance(node, Comment):
+            out.append(f"<!--{node.comment}-->")
+        elif isinstance(node, DocumentType):
+            out.append("<!DOCTYPE html>")
+
+    def leave(node, depth, out):
+        if isinstance(node, Element) and not node.selfClosing:
+            out.append(f"</{node.tag}>")
+
+    return _walk(root, enter, leave)
+
+
+def iter_text(root):
+    """
+    Yields the text of every text node below `root`, one per line.
+    """
+
+    def enter(node, depth, out):
+        if isinstance(node, Text) and node.text:
+            out.append(node.text + "\n")
+
+    return _walk(root, enter)
+
+
+def iter_tree(root, indent: int = 0):
+    """
+    Yields one indented line per node of the tree below `root` (tag names and text).
+    """
+
+    def enter(node, depth, out):
+        line = " " * (indent + 2 * depth) + " "
+        if isinstance(node, Element):
+            line += node.tag
+        elif isinstance(node, Text):
+            line += node.text
+        out.append(line + "\n")
+
+    return _walk(root, enter)
+
+
+def write_outer_html(root, file):
+    """
+    Writes the HTML source of `root` to a text `file`.
+    """
+    file.writelines(iter_outer_html(root))
+
+
+def outer_html(root):
+    """
+    :return: The HTML source of `root` as a single string.
+    """
+    return "".join(iter_outer_html(root))
+
+
+class Pager:
+    """
+    Cuts the output of a serializer into pages of at most `page_size` characters,
+    without splitting pieces that fit on a page.
+
+    Pages are produced on demand: reading the pages in order runs the serializer
+    once, and going back to an earlier page restarts it.
+    """
+
+    PAGE_SIZE = 4096
+
+    def __init__(self, serialize, page_size: int = PAGE_SIZE):
+        """
+        :param serialize: A function returning a fresh generator of string pieces.
+        """
+        self.serialize = serialize
+        self.page_size = page_size
+        self._pieces = None
+        self._next_page = 0  # number of the page `_pieces` continues with
+        self._pending = ""  # (part of) a piece that did not fit on the last page
+        self._done = False
+
+    def page(self, number: int = 1):
+        """
+        :param number: The page number, starting at 1.
+        :return: A `(text, has_more)` tuple, `text` is empty past the last page.
+        """
+        index = max(number, 1) - 1
+        if self._pieces is None or index < self._next_page:
+            self._pieces = self.serialize()
+            self._next_page = 0
+            self._pending = ""
+            self._done = False
+
+        text = ""
+        while self._next_page <= index:
+            text = self._read_page()
+            self._next_page += 1
+        return text, not self._done or bool(self._pending)
+
+    def _read_page(self):
+        parts = []
+        length = 0
+        while self._pending or not self._done:
+            if self._pending:
+                piece, self._pending = self._pending, ""
+            else:
+                try:
+                    piece = next(self._pieces)
+                except StopIteration:
+                    self._done = True
+                    break
+            if length + len(piece) > self.page_size:
+                if parts:
+                    # pages end between pieces (e.g. lines or tags) where possible
+                    self._pending = piece
+                else:
+                    parts.append(piece[: self.page_size])
+                    self._pending = piece[self.page_size :]
+                break
+            parts.append(piece)
+            length += len(piece)
+        return "".join(parts)
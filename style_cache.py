@@ -0,0 +1,62 @@
+import hashlib
+from collections import OrderedDict
+from css_parser import CSSParser
+
+
+class StylesheetCache:
+    """
+    A bounded LRU cache of compiled stylesheets, keyed by URL and a hash of the CSS.
+
+    The cached `Stylesheet`s are shared by every tab and must not be modified.
+    """
+
+    MAX_ENTRIES = 64
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, url: str, css: str):
+        digest = hashlib.blake2b(css.encode("utf-8"), digest_size=16)
+        return (url, digest.hexdigest())
+
+    def get(self, url: str, css: str, css_parser=None):
+        """
+        :param css_parser: A `CSSParser` that was already fed `css` (e.g. while
+            downloading it), used instead of parsing `css` again on a miss.
+        :return: The compiled stylesheet for `css` (loaded from `url`),
+            parsing it only if it is not cached yet.
+        """
+        key = self.key(url, css)
+        sheet = self.entries.get(key)
+        if sheet is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return sheet
+
+        self.misses += 1
+        if css_parser is None:
+            css_parser = CSSParser()
+            css_parser.parse(external_styles=css)
+        else:
+            css_parser.close()
+        sheet = css_parser.stylesheet()
+        self.entries[key] = sheet
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return sheet
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = self.misses = 0
@@ -0,0 +1,424 @@
+import re
+import math
+from bisect import bisect_right
+from nodes import Element
+
+
+class Selector:
+    """
+    A compiled selector such as `div.note > p a`: compound selectors (a tag or `*`,
+    `#id` and `.class` parts) joined by descendant (space) or child (`>`) combinators.
+
+    Raises `ValueError` for selectors that are not supported.
+    """
+
+    __slots__ = ("text", "parts", "specificity")
+
+    COMPOUND_PATTERN = re.compile(r"(\*|[a-zA-Z][\w-]*)?((?:[#.][\w-]+)*)")
+    SIMPLE_PATTERN = re.compile(r"[#.][\w-]+")
+
+    def __init__(self, text: str):
+        self.text = text
+        # (tag, id, classes, combinator) from right to left, where the combinator
+        # relates each compound to the one before it in this list
+        self.parts = []
+        ids = classes_count = tags = 0
+
+        tokens = text.replace(">", " > ").split()
+        if not tokens or tokens[0] == ">" or tokens[-1] == ">":
+            raise ValueError(f"Invalid selector: {text}")
+
+        combinator = None
+        for token in reversed(tokens):
+            if token == ">":
+                if combinator is not None:
+                    raise ValueError(f"Invalid selector: {text}")
+                combinator = ">"
+                continue
+
+            match = self.COMPOUND_PATTERN.fullmatch(token)
+            if match is None:
+                raise ValueError(f"Unsupported selector: {text}")
+            tag = match.group(1)
+            if tag == "*":
+                tag = None
+            elif tag is not None:
+                tag = tag.lower()
+                tags += 1
+            element_id = None
+            classes = set()
+            for simple in self.SIMPLE_PATTERN.findall(match.group(2)):
+                if simple[0] == "#":
+                    element_id = simple[1:]
+                    ids += 1
+                else:
+                    classes.add(simple[1:])
+                    classes_count += 1
+
+            if self.parts:
+                combinator = combinator or " "
+            self.parts.append((tag, element_id, frozenset(classes), combinator))
+            combinator = None
+
+        self.specificity = (ids, classes_count, tags)
+
+    @property
+    def key(self):
+        """
+        The most selective part of the rightmost compound, as `(kind, value)`
+        with kind "id", "class", "tag" or "*".
+        """
+        tag, element_id, classes, _ = self.parts[0]
+        if element_id is not None:
+            return ("id", element_id)
+        if classes:
+            return ("class", min(classes))
+        if tag is not None:
+            return ("tag", tag)
+        return ("*", None)
+
+    def matches(self, element: Element):
+        tag, element_id, classes, _ = self.parts[0]
+        if not _compound_matches(element, tag, element_id, classes):
+            return False
+        return self._ancestors_match(1, element)
+
+    def _ancestors_match(self, index: int, element: Element):
+        if index == len(self.parts):
+            return True
+        tag, element_id, classes, combinator = self.parts[index]
+        node = element.parent
+        while isinstance(node, Element):
+            if _compound_matches(node, tag, element_id, classes):
+                if self._ancestors_match(index + 1, node):
+                    return True
+            if combinator == ">":
+                return False
+            node = node.parent
+        return False
+
+    def __str__(self):
+        return self.text
+
+
+def _compound_matches(element: Element, tag, element_id, classes):
+    if tag is not None and element.tag != tag:
+        return False
+    if element_id is None and not classes:
+        return True
+    attributes = element.attributes
+    if element_id is not None and attributes.get("id") != element_id:
+        return False
+    if classes:
+        class_names = attributes.get("class")
+        if not class_names or not classes.issubset(class_names.split()):
+            return False
+    return True
+
+
+class MediaQuery:
+    """
+    The conditions of the `@media` blocks a rule is nested in, all of which must match.
+
+    Supports comma-separated query lists with the media types `all`, `screen` and
+    `print`, `only` and `not`, and the `min-width` and `max-width` features in `px`
+    or `em`. Queries using anything else never match.
+
+    Raises `ValueError` for at-rules other than `@media`.
+    """
+
+    __slots__ = ("text", "blocks", "breakpoints")
+
+    FEATURE_PATTERN = re.compile(
+        r"\(\s*(min|max)-width\s*:\s*(\d+(?:\.\d*)?)(px|em)?\s*\)"
+    )
+    AT_RULE_PATTERN = re.compile(r"@([\w-]+)\s*(.*)", re.DOTALL)
+    AND_PATTERN = re.compile(r"\s+and\s+")
+    # the size of an `em` in media queries
+    EM_PX = 16
+
+    def __init__(self, preludes):
+        """
+        :param preludes: The preludes of the blocks, outermost first,
+            e.g. `("@media (max-width: 600px)",)`.
+        """
+        self.text = " ".join(preludes)
+        # for every block, its alternatives as `(negated, media type matches, features)`
+        # with features as `(kind, width)` pairs, or `None` if the query is not supported
+        self.blocks = []
+        breakpoints = set()
+        for prelude in preludes:
+            match = self.AT_RULE_PATTERN.fullmatch(prelude)
+            if match is None or match.group(1).lower() != "media":
+                raise ValueError(f"Unsupported at-rule: {prelude}")
+            alternatives = []
+            for query in match.group(2).lower().split(","):
+                alternative = self._parse_query(query.strip())
+                alternatives.append(alternative)
+                if alternative is not None:
+                    for kind, width in alternative[2]:
+                        # the first width at which the feature starts or stops matching
+                        if kind == "min":
+                            breakpoints.add(math.ceil(width))
+                        else:
+                            breakpoints.add(math.floor(width) + 1)
+            self.blocks.append(alternatives)
+        self.breakpoints = sorted(breakpoints)
+
+    def _parse_query(self, query: str):
+        negated = False
+        type_matches = True
+        parts = self.AND_PATTERN.split(query) if query else ["all"]
+        if not parts[0].startswith("("):
+            words = parts.pop(0).split()
+            if words and words[0] in ("not", "only"):
+                negated = words.pop(0) == "not"
+            if len(words) != 1 or words[0] not in ("all", "screen", "print"):
+                return None
+            type_matches = words[0] != "print"
+
+        features = []
+        for part in parts:
+            match = self.FEATURE_PATTERN.fullmatch(part)
+            if match is None:
+                return None
+            kind, width, unit = match.groups()
+            width = float(width)
+            if unit == "em":
+                width *= self.EM_PX
+            features.append((kind, width))
+        return (negated, type_matches, features)
+
+    def matches(self, width=None):
+        """
+        :param width: The viewport width, `None` if unknown (width features never match then).
+        """
+        for alternatives in self.blocks:
+            for alternative in alternatives:
+                if alternative is None:
+                    continue
+                negated, type_matches, features = alternative
+                if features and width is None:
+                    continue
+                matches = type_matches and all(
+                    width >= value if kind == "min" else width <= value
+                    for kind, value in features
+                )
+                if matches != negated:
+                    break
+            else:
+                return False
+        return True
+
+    def __str__(self):
+        return self.text
+
+
+class Rule:
+    """
+    A style rule: a selector with its declarations and its position in the stylesheet,
+    and the `MediaQuery` it is conditional on, if any.
+    """
+
+    __slots__ = ("selector", "declarations", "order", "media")
+
+    def __init__(self, selector: Selector, declarations: dict, order: int, media=None):
+        self.selector = selector
+        self.declarations = declarations
+        self.order = order
+        self.media = media
+
+    @property
+    def priority(self):
+        """
+        Cascade order: higher specificity wins, then the later rule.
+        """
+        return (self.selector.specificity, self.order)
+
+
+class Stylesheet:
+    """
+    A compiled stylesheet. Rules are indexed by the id, class or tag of their
+    rightmost compound selector, so matching an element only tests the rules
+    that could possibly apply to it.
+
+    The viewport widths at which the media queries of the stylesheet start or stop
+    matching are collected in `breakpoints`: styles can only change when a resize
+    crosses one of them.
+    """
+
+    def __init__(self, rules=()):
+        """
+        :param rules: `(selector text, declarations)` pairs in source order, or
+            `(selector text, declarations, at-rule preludes)` for rules nested in
+            at-rule blocks, e.g. `CSSParser.rules`.
+        """
+        self.rules = []
+        # every id and class name used anywhere in a selector
+        self.ids = set()
+        self.classes = set()
+        self.breakpoints = []
+        self._media = {}  # compiled media queries by their preludes
+        self._by_id = {}
+        self._by_class = {}
+        self._by_tag = {}
+        self._universal = []
+        for rule in rules:
+            self.add_rule(*rule)
+
+    @classmethod
+    def from_styles(cls, styles: dict):
+        """
+        Compiles a `{selector: declarations}` dict, e.g. `CSSParser.styles`.
+        """
+        return cls(styles.items())
+
+    def add_rule(self, selector: str, declarations: dict, conditions=()):
+        """
+        Adds a rule after all the existing ones. Unsupported selectors and
+        at-rules are ignored.
+
+        :param conditions: The preludes of the at-rule blocks the rule is nested in.
+        :return: The new `Rule`, or `None` if it was ignored.
+        """
+        try:
+            compiled = Selector(selector)
+            media = self._media_query(tuple(conditions)) if conditions else None
+        except ValueError:
+            return None
+        rule = Rule(compiled, declarations, len(self.rules), media)
+        self.rules.append(rule)
+        for _, element_id, classes, _ in compiled.parts:
+            if element_id is not None:
+                self.ids.add(element_id)
+            self.classes.update(classes)
+
+        kind, value = compiled.key
+        if kind == "id":
+            self._by_id.setdefault(value, []).append(rule)
+        elif kind == "class":
+            self._by_class.setdefault(value, []).append(rule)
+        elif kind == "tag":
+            self._by_tag.setdefault(value, []).append(rule)
+        else:
+            self._universal.append(rule)
+        return rule
+
+    def _media_query(self, conditions: tuple):
+        media = self._media.get(conditions)
+        if media is None:
+            media = self._media[conditions] = MediaQuery(conditions)
+            if media.breakpoints:
+                self.breakpoints = sorted(set(self.breakpoints).union(media.breakpoints))
+        return media
+
+    def media_state(self, width):
+        """
+        :return: The index of the range between `breakpoints` that `width` falls in.
+            Widths with the same state match the same media queries.
+        """
+        if width is None:
+            return None
+        return bisect_right(self.breakpoints, width)
+
+    def candidates(self, element: Element):
+        """
+        :return: The rules whose rightmost id, class or tag fits `element`
+            (each rule at most once).
+        """
+        candidates = list(self._universal)
+        candidates.extend(self._by_tag.get(element.tag, ()))
+        attributes = element.attributes
+        if attributes:
+            element_id = attributes.get("id")
+            if element_id:
+                candidates.extend(self._by_id.get(element_id, ()))
+            class_names = attributes.get("class")
+            if class_names:
+                for class_name in set(class_names.split()):
+                    candidates.extend(self._by_class.get(class_name, ()))
+        return candidates
+
+    def matching_rules(self, element: Element, width=None):
+        """
+        :param width: The viewport width for media queries, `None` if unknown.
+        :return: The rules that match `element`, in cascade order (lowest priority first).
+        """
+        rules = [
+            rule
+            for rule in self.candidates(element)
+            if rule.selector.matches(element)
+            and (rule.media is None or rule.media.matches(width))
+        ]
+        rules.sort(key=lambda rule: rule.priority)
+        return rules
+
+    def match(self, element: Element, width=None):
+        """
+        :param width: The viewport width for media queries, `None` if unknown.
+        :return: The declarations that apply to `element` after the cascade.
+        """
+        styles = {}
+        for rule in self.matching_rules(element, width):
+            styles.update(rule.declarations)
+        return styles
+
+    def __len__(self):
+        return len(self.rules)
+
+
+class Cascade:
+    """
+    Stylesheets layered on top of each other without merging them, e.g. the
+    browser's default stylesheet below the page's stylesheets. Rules of a later
+    layer win over those of earlier layers; within a layer, specificity and
+    then the order of the sheets and rules decide.
+
+    Media queries are evaluated for `viewport_width`, which the owner of the
+    cascade sets before resolving styles.
+    """
+
+    def __init__(self, layers=(), viewport_width=None):
+        """
+        :param layers: Lists of `Stylesheet`s, lowest priority first.
+        """
+        self.layers = [list(sheets) for sheets in layers]
+        self.viewport_width = viewport_width
+        self.ids = set()
+        self.classes = set()
+        breakpoints = set()
+        for sheets in self.layers:
+            for sheet in sheets:
+                self.ids.update(sheet.ids)
+                self.classes.update(sheet.classes)
+                breakpoints.update(sheet.breakpoints)
+        self.breakpoints = sorted(breakpoints)
+
+    def media_state(self, width):
+        """
+        :return: The index of the range between `breakpoints` that `width` falls in.
+            Widths with the same state match the same media queries.
+        """
+        if width is None:
+            return None
+        return bisect_right(self.breakpoints, width)
+
+    def match(self, element: Element):
+        """
+        :return: The declarations that apply to `element` after the cascade.
+        """
+        matched = []
+        for layer, sheets in enumerate(self.layers):
+            for index, sheet in enumerate(sheets):
+                for rule in sheet.matching_rules(element, self.viewport_width):
+                    matched.append(
+                        ((layer, rule.selector.specificity, index, rule.order), rule)
+                    )
+        matched.sort(key=lambda item: item[0])
+        styles = {}
+        for _, rule in matched:
+            styles.update(rule.declarations)
+        return styles
+
+    def __len__(self):
+        return sum(len(sheet) for sheets in self.layers for sheet in sheets)
@@ -1,11 +1,19 @@
+import queue
+import threading
 from font import Font
 from download import URL
 from tkinter import Canvas
 from console import Console
 from scrollbar import Scrollbar
-from css_parser import CSSParser
 from url_parser import URLParser
-from html_parser import HTMLParser, print_tree
+from html_parser import HTMLParser
+from parse_cache import ParseCache
+from css_parser import CSSParser
+from style_cache import StylesheetCache
+from stylesheet import Cascade
+from computed_style import resolve_style_steps
+from serializer import Pager, iter_outer_html, iter_text, iter_tree
+from scheduler import Scheduler
 from history_manager import HistoryManager
 from js_context import JSContext
 from layout import Layout, print_layout_tree
@@ -19,6 +27,19 @@ class Tab:
     HSTEP, VSTEP = 13, 18
     BROWSER_DEFAULT_STYLESHEET = "file:///E:/ky_browser/browser.css"
     BROWSER_DEFAULT_JAVASCRIPT = "file:///E:/ky_browser/runtime.js"
+    # shared by all tabs; pass `cache_dir` to keep parsed pages between sessions
+    PARSE_CACHE = ParseCache()
+    # compiled stylesheets shared by all tabs
+    STYLESHEET_CACHE = StylesheetCache()
+    _default_stylesheet = None
+    # text nodes reference slices of `self.content` until they are read
+    LAZY_TEXT = True
+    # characters fed to the parser per step of a time-sliced load
+    PARSE_STEP = 16 * 1024
+    # lay out pages front to back and paint them as soon as the viewport is laid out
+    LAZY_LAYOUT = True
+    # how far below the viewport to lay out before that first paint, in pixels
+    LAZY_MARGIN = 500
 
     def __init__(
         self,
@@ -44,8 +65,30 @@ class Tab:
         # dom tree root
         self.dom_root = None
 
+        # styles of the loaded page, reused when it is laid out again
+        self.stylesheet = None
+        # the media state of `stylesheet` the document's styles were resolved for
+        self._style_state = None
+        self.style_sharing = None  # `StyleSharingCache` of the last style resolution
+        # pagers over the serialized dom, by kind, for the console
+        self._pagers = {}
+        self._pagers_root = None
+
         # layout
         self.display_list = []
+        self.background = "white"
+        self._layout_size = None  # (width, height) of the last layout
+        self.layout_tree = None  # complete `Layout` of the document, reflowed on resize
+        self._painted = 0  # display list entries already painted while loading
+        self._lazy_layout = None  # `Layout` of a lazy layout in progress
+        # document height the scrollbars were last drawn for during a lazy layout
+        self._painted_height = None
+
+        # whether this is the tab shown on the canvas
+        self.active = True
+
+        # runs loads and relayouts in time slices on the Tk event loop
+        self.scheduler = Scheduler(canvas, on_slice=self._paint_progress)
 
         # history manager
         self.history_manager = HistoryManager()
@@ -70,16 +113,97 @@ class Tab:
             ("get_prev_history_url", self.print_prev_history_url),
             ("get_next_history_url", self.print_next_history_url),
             ("print_document_tree", self.print_dom_tree),
+            ("print_outer_html", self.print_outer_html),
+            ("print_text", self.print_text),
+            ("print_parse_cache_stats", self.print_parse_cache_stats),
+            ("get_element_by_id", self.get_element_by_id),
+            ("get_elements_by_tag_name", self.get_elements_by_tag_name),
+            ("get_elements_by_class_name", self.get_elements_by_class_name),
         ]
         self.js_ctx._register(data)
 
         self.load_defaults()
 
-    def print_dom_tree(self):
+    def _print_page(self, kind: str, serialize, page=None):
+        """
+        Shows one page of the serialized DOM in the console and returns it.
+
+        :param kind: Name of the `document` method that pages through this output.
+        :param serialize: Serializer from `serializer`, called with the DOM root.
+        :param page: The page number, starting at 1.
+        """
         if self.dom_root is None:
             self.js_ctx.result = "null"
+            return None
+        if self._pagers_root is not self.dom_root:
+            self._pagers = {}
+            self._pagers_root = self.dom_root
+        pager = self._pagers.get(kind)
+        if pager is None:
+            root = self.dom_root
+            pager = self._pagers[kind] = Pager(lambda: serialize(root))
+
+        number = max(int(page or 1), 1)
+        text, has_more = pager.page(number)
+        if has_more:
+            footer = f"-- page {number}, next: document.{kind}({number + 1}) --"
+        else:
+            footer = f"-- page {number}, end --"
+        self.js_ctx.result = f"{text}\n{footer}"
+        return text
+
+    def print_dom_tree(self, page=None):
+        return self._print_page("tree", iter_tree, page)
+
+    def print_outer_html(self, page=None):
+        return self._print_page("outerHTML", iter_outer_html, page)
+
+    def print_text(self, page=None):
+        return self._print_page("text", iter_text, page)
+
+    def print_parse_cache_stats(self):
+        stats = self.PARSE_CACHE.stats()
+        self.js_ctx.result = (
+            f"entries: {stats['entries']}, hits: {stats['hits']}, "
+            f"disk hits: {stats['disk_hits']}, misses: {stats['misses']}, "
+            f"hit rate: {stats['hit_rate']:.0%}"
+        )
+
+    def _describe_elements(self, elements: list):
+        """
+        Shows the looked up `elements` in the console and returns them as
+        plain data for JavaScript.
+        """
+        if not elements:
+            self.js_ctx.result = "null"
         else:
-            self.js_ctx.result = print_tree(self.dom_root, 0, False)
+            self.js_ctx.result = "\n".join(str(element) for element in elements)
+        return [
+            {"tag": element.tag, "attributes": dict(element.attributes)}
+            for element in elements
+        ]
+
+    def get_element_by_id(self, element_id: str):
+        if self.dom_root is None:
+            self.js_ctx.result = "null"
+            return None
+        element = self.dom_root.get_element_by_id(element_id)
+        described = self._describe_elements([element] if element else [])
+        return described[0] if described else None
+
+    def get_elements_by_tag_name(self, tag: str):
+        if self.dom_root is None:
+            self.js_ctx.result = "null"
+            return []
+        return self._describe_elements(self.dom_root.get_elements_by_tag_name(tag))
+
+    def get_elements_by_class_name(self, class_names: str):
+        if self.dom_root is None:
+            self.js_ctx.result = "null"
+            return []
+        return self._describe_elements(
+            self.dom_root.get_elements_by_class_name(class_names)
+        )
 
     def log(self, *args):
         self.js_ctx.result = " ".join(str(arg) for arg in args)
@@ -111,7 +235,9 @@ class Tab:
         self.scroll_bar.update_screen_dimensions(self.WIDTH, self.HEIGHT)
 
     def _change_canvas_background(self, color: str = "white"):
-        self.canvas.config(background=color)
+        self.background = color
+        if self.active:
+            self.canvas.config(background=color)
 
     def _clear_canvas(self):
         self.canvas.delete("all")
@@ -130,30 +256,170 @@ class Tab:
         except IndexError:
             return None
 
-    def load(self, url: str, update_history: bool = True):
+    def load(self, url: str, update_history: bool = True, on_loaded=None):
+        """
+        Loads `url` without blocking the window: the download runs in a background
+        thread while parsing, layout and rendering run in time slices on the event
+        loop, painting whatever is ready in between. A new load cancels this one.
+
+        :param on_loaded: Called once the page is laid out, drawn and its scripts ran.
+        """
         if url:
-            # download the content from the URL
             self.url = url
-            self.content, self.mediaType = URL(url).request()
-            if self.url and update_history:
-                self.history_manager.add(self.url)
-            # parse the loaded content
-            self.parse()
-            # draw the content on the canvas
+            if update_history:
+                self.history_manager.add(url)
+            self.scheduler.run(
+                self._load_steps(url),
+                f"load {url}",
+                on_done=lambda: self._loaded(url, on_loaded),
+            )
+
+    def _load_steps(self, url: str):
+        """
+        The steps of `load`, to be run by `self.scheduler`.
+        """
+        yield "fetch"
+        # the download thread hands chunks over through the queue,
+        # the parser only ever runs here on the Tk thread
+        chunks = queue.Queue()
+        response = []
+
+        def fetch():
+            try:
+                response.append(
+                    URL(url).request(
+                        lambda chunk, mediaType: chunks.put((chunk, mediaType))
+                    )
+                )
+            finally:
+                chunks.put(None)
+
+        threading.Thread(target=fetch, daemon=True).start()
+
+        # parse HTML while it arrives, unless the page was cached before: it is
+        # then likely unchanged and is looked up once it has arrived completely
+        stream = not self.PARSE_CACHE.remembers(url)
+        html_parser = HTMLParser(lazy_text=self.LAZY_TEXT)
+        streamed = 0
+        while True:
+            try:
+                item = chunks.get_nowait()
+            except queue.Empty:
+                yield Scheduler.WAIT
+                continue
+            if item is None:
+                break
+            chunk, mediaType = item
+            if "text/html" in mediaType and stream:
+                for start in range(0, len(chunk), self.PARSE_STEP):
+                    html_parser.feed(chunk[start : start + self.PARSE_STEP])
+                    yield
+                streamed += len(chunk)
+
+        self.content, self.mediaType = response[0] if response else ("", "text/plain")
+
+        # reuse the streamed tree if it is complete
+        if streamed and streamed == len(self.content):
+            yield from self._parse_steps(html_parser)
+        else:
+            yield from self._parse_steps()
+
+    def _loaded(self, url: str, on_loaded=None):
+        timeline = self.scheduler.format_timeline()
+        if self.style_sharing is not None and self.style_sharing.elements:
+            stats = self.style_sharing.stats()
+            timeline += (
+                f"\n  styles: {stats['elements']} elements, {stats['styles']} computed, "
+                f"{stats['shared']} shared "
+                f"({stats['shared'] / stats['elements']:.0%})"
+            )
+        stats = Font.CACHE.stats()
+        timeline += (
+            f"\n  fonts: {stats['entries']} cached, {stats['hits']} hits, "
+            f"{stats['misses']} misses; word widths: {stats['word_hit_rate']:.0%} cached"
+        )
+        layout_tree = self.layout_tree
+        if layout_tree is not None and layout_tree.memo_hits + layout_tree.memo_misses:
+            subtrees = layout_tree.memo_hits + layout_tree.memo_misses
+            timeline += (
+                f"\n  layout: {layout_tree.memo_hits} of {subtrees} subtrees reused "
+                f"({layout_tree.memo_hits / subtrees:.0%})"
+            )
+        self.console.add_message(f"Timeline: {url}", timeline)
+        # the window was resized while the page was being laid out
+        if self._layout_size != (self.WIDTH, self.HEIGHT):
+            self.relayout()
+        if on_loaded is not None:
+            on_loaded()
+
+    def relayout(self):
+        """
+        Lays out the loaded content again (e.g. after a resize) in time slices,
+        or just redraws it if the layout is still valid for the current size.
+        A load in progress is left to finish, it relayouts when done if needed.
+        """
+        if self.scheduler.running:
+            if self.scheduler.name.startswith("load"):
+                return
+        elif self._layout_size == (self.WIDTH, self.HEIGHT):
             self.draw()
+            return
+        self.scheduler.run(self._relayout_steps(), f"relayout {self.url}")
+
+    def stop(self):
+        """
+        Cancels the load or relayout in progress.
+        """
+        self.scheduler.cancel()
+
+    def _paint_progress(self):
+        """
+        Paints the partially rendered page between time slices, as long as new
+        draw commands still land in the visible area.
+        """
+        if not self.active:
+            return
+        if self._lazy_layout is not None:
+            if self._painted_height is None:
+                # not painted yet, wait for the "first paint"
+                return
+            # correct the scroll extents as the real heights come in
+            height = self._lazy_layout.estimated_height()
+            if abs(height - self._painted_height) * 10 > self._painted_height:
+                self.draw()
+                self._painted = len(self.display_list)
+                return
+        if self._painted >= len(self.display_list):
+            return
+        top = self.scroll_bar.v_scroll - self.VSTEP
+        bottom = self.scroll_bar.v_scroll + self.HEIGHT
+        for i in range(self._painted, len(self.display_list)):
+            if top <= self.display_list[i].y <= bottom:
+                self.draw()
+                break
+        self._painted = len(self.display_list)
+
+    @classmethod
+    def default_stylesheet(cls):
+        """
+        The browser's default stylesheet, loaded once and shared by all tabs.
+        """
+        if cls._default_stylesheet is None:
+            link = cls.BROWSER_DEFAULT_STYLESHEET
+            content, _ = URL(link).request()
+            cls._default_stylesheet = cls.STYLESHEET_CACHE.get(link, content)
+        return cls._default_stylesheet
 
     def load_css(self, links: list[str]):
-        base_url = URLParser().extract_base_url(self.url)
+        """
+        Loads the page's stylesheets.
 
-        # Initialize CSS parser
-        css_parser = CSSParser()
-
-        # load the default browser styles
-        link = self.BROWSER_DEFAULT_STYLESHEET
-        content, _ = URL(link).request()
-        css_parser.parse(external_styles=content)
+        :return: A `Cascade` of the page's stylesheets over the default stylesheet.
+        """
+        base_url = URLParser().extract_base_url(self.url)
 
         # load external stylesheets
+        sheets = []
         for link in links:
             try:
                 idx = link.find("http")
@@ -161,12 +427,23 @@ class Tab:
                     link = f"{base_url}/{link.lstrip('/')}"
                 else:
                     link = link[idx:]
-                content, mediaType = URL(link).request()
+                # parse the stylesheet while it downloads
+                css_parser = CSSParser()
+                streamed = [0]
+
+                def on_chunk(chunk, mediaType):
+                    if "text/css" in mediaType:
+                        css_parser.feed(chunk)
+                        streamed[0] += len(chunk)
+
+                content, mediaType = URL(link).request(on_chunk)
                 if "text/css" in mediaType:
-                    css_parser.parse(external_styles=content)
+                    # responses served from the HTTP cache are not streamed
+                    fed = css_parser if streamed[0] and streamed[0] == len(content) else None
+                    sheets.append(self.STYLESHEET_CACHE.get(link, content, fed))
             except Exception as e:
                 self.console.add_message("", f"Error loading CSS from {link}: {e}")
-        return css_parser.styles
+        return Cascade([[self.default_stylesheet()], sheets])
 
     def load_defaults(self):
         # load the default browser scripts
@@ -196,58 +473,205 @@ class Tab:
                     "", f"Error loading JavaScript from {link}: {e}"
                 )
 
-    def parse(self):
-        self.display_list.clear()
+    def parse(self, html_parser: HTMLParser = None):
+        """
+        Parse and lay out the loaded content.
+
+        :param html_parser: An already closed parser holding the DOM of `self.content`,
+            e.g. one fed while downloading. If omitted, the content is parsed here.
+        """
+        for _ in self._parse_steps(html_parser):
+            pass
+
+    def _parse_steps(self, html_parser: HTMLParser = None, reload_styles: bool = True):
+        """
+        The steps of `parse`, yielding between small units of work
+        so that they can be run by `self.scheduler`.
+
+        :param html_parser: A parser fed with all of `self.content`, closed here.
+        :param reload_styles: Whether to load the page's stylesheets again,
+            otherwise the ones of the last layout are reused.
+        """
+        self.display_list = []
+        self._painted = 0
+        self._layout_size = None
+        self._style_state = None
+        self.layout_tree = None
 
         if not self.content or not self.url:
+            if self.active:
+                self.draw()
             return
 
+        self._layout_size = (self.WIDTH, self.HEIGHT)
         lTree = Layout(self.WIDTH, self.HEIGHT)
 
         if "text/html" in self.mediaType:
-            html_parser = HTMLParser(self.content)
-            self.dom_root = html_parser.parse()
+            yield "parse"
+            if html_parser is None:
+                # revisits of unchanged content skip the parser entirely
+                self.dom_root = self.PARSE_CACHE.get(self.content)
+                if self.dom_root is None:
+                    html_parser = HTMLParser(lazy_text=self.LAZY_TEXT)
+                    for start in range(0, len(self.content), self.PARSE_STEP):
+                        html_parser.feed(self.content[start : start + self.PARSE_STEP])
+                        yield
+            # cache the parsed document once the page is laid out
+            parsed = html_parser is not None
+            if parsed:
+                self.dom_root = html_parser.close()
+                yield
 
             if self.url.startswith("view-source:"):
                 self._change_canvas_background("black")
                 self.title = self.url
+                yield "layout"
                 lTree.source_view(self.font, self.dom_root)
+                yield from self._cache_steps(parsed)
             else:
                 self._change_canvas_background("white")
                 if self.url.startswith("data:text/html"):
                     self.title = self.url
                 else:
-                    title = html_parser.extract_title(self.dom_root)
+                    title = self.dom_root.title
                     if title is None:
                         self.title = URLParser().extract_base_url(self.url)
                     else:
                         self.title = title
 
-                # Extract links from the HTML content
-                html_parser.extract_links(self.dom_root)
-                styles = self.load_css(html_parser.links.get("css", []))
-
-                # render the HTML content
-                lTree.layout(self.dom_root, styles=styles)
-                lTree.render(lTree.node)
-                # print_layout_tree(lTree.node)
+                # links were indexed on the document while parsing
+                yield "style"
+                if reload_styles or self.stylesheet is None:
+                    self.stylesheet = self.load_css(self.dom_root.links.get("css", []))
+                yield from self._style_steps()
+                yield from self._layout_steps(lTree)
+                yield from self._cache_steps(parsed)
 
                 # Load JavaScript files
-                self.load_js(html_parser.links.get("js", []))
+                yield "script"
+                self.load_js(self.dom_root.links.get("js", []))
         else:
             self._change_canvas_background("#1c1b22")
             self.title = self.url
+            yield "layout"
             lTree.file_view(self.content, self.font)
 
+        yield from self._paint_steps(lTree)
+
+    def _cache_steps(self, parsed: bool):
+        """
+        Adds the document to `PARSE_CACHE` if it was just parsed, in time slices.
+        """
+        if parsed:
+            yield "cache"
+            yield from self.PARSE_CACHE.put_steps(self.content, self.dom_root, self.url)
+
+    def _relayout_steps(self):
+        """
+        The steps of `relayout`: lays out the current document for the new size.
+        Styles are only resolved again if the viewport width crossed a breakpoint
+        of the page's media queries, otherwise the layout tree is reflowed.
+        """
+        if (
+            self.dom_root is None
+            or self.stylesheet is None
+            or "text/html" not in self.mediaType
+            or self.url.startswith("view-source:")
+        ):
+            yield from self._parse_steps(reload_styles=False)
+            return
+
+        self.display_list = []
+        self._painted = 0
+        self._layout_size = (self.WIDTH, self.HEIGHT)
+        if self.stylesheet.media_state(self.WIDTH) != self._style_state:
+            yield "style"
+            yield from self._style_steps()
+        if self.layout_tree is None:
+            lTree = Layout(self.WIDTH, self.HEIGHT)
+            yield from self._layout_steps(lTree)
+        else:
+            # same styles: reflow the current layout tree for the new width
+            lTree = self.layout_tree
+            yield from self._layout_steps(lTree, reflow=True)
+        yield from self._paint_steps(lTree)
+
+    def _style_steps(self):
+        """
+        Resolves the styles of the document for the current viewport width
+        (with `LAZY_LAYOUT`, the layout resolves them as it gets to the elements).
+        """
+        self._style_state = None
+        self.layout_tree = None
+        self.stylesheet.viewport_width = self.WIDTH
+        if not self.LAZY_LAYOUT:
+            self.style_sharing = yield from resolve_style_steps(
+                self.dom_root, self.stylesheet
+            )
+        self._style_state = self.stylesheet.media_state(self.WIDTH)
+
+    def _layout_steps(self, lTree: Layout, reflow: bool = False):
+        # render the HTML content, painting the display list as it grows
+        yield "layout"
+        if reflow:
+            yield from lTree.reflow_steps(self.WIDTH, self.HEIGHT)
+        elif self.LAZY_LAYOUT:
+            yield from self._lazy_layout_steps(lTree)
+            return
+        else:
+            self.layout_tree = None
+            yield from lTree.layout_steps(self.dom_root, styles=None)
+            self.layout_tree = lTree
+        yield "render"
+        self.display_list = lTree.display_list
+        yield from lTree.render_steps(lTree.node)
+        # print_layout_tree(lTree.node)
+
+    def _lazy_layout_steps(self, lTree: Layout):
+        """
+        Lays out (and renders) the document front to back, painting it as soon as the
+        viewport and `LAZY_MARGIN` below it are laid out. The rest is laid out in the
+        following time slices, painted as it comes into view, and the scroll extents
+        follow the estimated height of the document until it is done.
+        """
+        self.layout_tree = None
+        self.display_list = lTree.display_list
+        self._lazy_layout = lTree
+        self._painted_height = None
+        first_screen = self.scroll_bar.v_scroll + self.HEIGHT + self.LAZY_MARGIN
+        try:
+            for _ in lTree.layout_steps(self.dom_root, styles=self.stylesheet, lazy=True):
+                if first_screen is not None and lTree.laid_out_y > first_screen:
+                    first_screen = None
+                    yield "first paint"
+                    self._painted = len(self.display_list)
+                    if self.active:
+                        self.draw()
+                    yield "layout rest"
+                yield
+        finally:
+            self._lazy_layout = None
+        self.style_sharing = lTree.style_sharing
+        self.layout_tree = lTree
+
+    def _paint_steps(self, lTree: Layout):
         # draw the display list
+        yield "paint"
         self.display_list = lTree.display_list
-        self.draw()
+        self._painted = len(self.display_list)
+        if self.active:
+            self.draw()
 
     def draw(self):
         self._clear_canvas()
-
-        # calculate scroll limits
-        self.scroll_bar.calc_max_scroll(self.display_list, self.font)
+        self.canvas.config(background=self.background)
+
+        # calculate scroll limits (from the estimated height during a lazy layout)
+        content_height = None
+        if self._lazy_layout is not None:
+            content_height = self._lazy_layout.estimated_height()
+            self._painted_height = content_height
+        self.scroll_bar.calc_max_scroll(self.display_list, self.font, content_height)
 
         # Calculate effective display area (excluding scrollbars)
         effective_width = self.WIDTH - (
@@ -0,0 +1,75 @@
+import os
+import unittest
+from css_parser import CSSParser
+from html_parser import HTMLParser
+from layout import Layout
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _display_available():
+    try:
+        import tkinter
+
+        tkinter.Tk().destroy()
+        return True
+    except Exception:
+        return False
+
+
+@unittest.skipUnless(_display_available(), "no display")
+class LazyLayoutTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        import tkinter
+
+        # fonts need a Tk instance
+        cls.window = tkinter.Tk()
+        with open(os.path.join(ROOT, "browser.css")) as file:
+            parser = CSSParser()
+            parser.parse(external_styles=file.read())
+        cls.styles = parser.styles
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.window.destroy()
+
+    def layout(self, html, lazy):
+        layout = Layout(800, 600)
+        prepared = []
+        prepare_steps = layout._prepare_steps
+
+        def counting_prepare_steps(nodes, *args, **kwargs):
+            prepared.append(1)
+            return prepare_steps(nodes, *args, **kwargs)
+
+        layout._prepare_steps = counting_prepare_steps
+        for _ in layout.layout_steps(HTMLParser(html).parse(), self.styles, lazy=lazy):
+            pass
+        if not lazy:
+            layout.render(layout.node)
+        return layout, len(prepared)
+
+    def display(self, layout):
+        return [(type(cmd).__name__, cmd.x, cmd.y) for cmd in layout.display_list]
+
+    def test_lazy_layout_matches_eager_layout(self):
+        items = "".join(f"<li>Item {i} <b>bold</b></li>" for i in range(2000))
+        html = f"<html><body><h1>List</h1><ul>{items}</ul><p>End</p></body></html>"
+        eager, _ = self.layout(html, lazy=False)
+        lazy, _ = self.layout(html, lazy=True)
+        self.assertEqual(self.display(lazy), self.display(eager))
+        self.assertEqual(lazy.estimated_height(), eager.estimated_height())
+
+    def test_deep_nesting_is_prepared_once(self):
+        depth = 5000
+        html = "<html><body>" + "<div>x " * depth + "</div>" * depth + "</body></html>"
+        eager, _ = self.layout(html, lazy=False)
+        lazy, prepared = self.layout(html, lazy=True)
+        self.assertEqual(self.display(lazy), self.display(eager))
+        # every node is walked by a single prepare, a few hundred at a time
+        self.assertLessEqual(prepared, 2 * depth // Layout.LAZY_PREPARE_NODES + 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import threading
+import functools
+import http.server
+import importlib.util
+from nodes import SourceText
+from html_parser import HTMLParser
+from parse_cache import ParseCache
+from serializer import iter_outer_html
+
+PAGE = "<!DOCTYPE html><html><head><title>Cached</title></head><body>{}</body></html>"
+BODY = "".join(f"<p class='item'>Item {i} &amp; more</p>" for i in range(200))
+
+
+class ParseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.html = PAGE.format(BODY)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_hit_returns_a_fresh_copy(self):
+        cache = ParseCache()
+        document = HTMLParser(self.html, lazy_text=True).parse()
+        cache.put(self.html, document)
+        first = cache.get(self.html)
+        second = cache.get(self.html)
+        self.assertIsNot(first, second)
+        self.assertEqual("".join(iter_outer_html(first)), "".join(iter_outer_html(document)))
+        self.assertEqual(first.title, "Cached")
+        self.assertEqual(cache.stats()["hits"], 2)
+
+    def test_disk_entries_are_json_and_keep_text_lazy(self):
+        document = HTMLParser(self.html, lazy_text=True).parse()
+        ParseCache(cache_dir=self.cache_dir).put(self.html, document, "http://example.com/")
+
+        cache = ParseCache(cache_dir=self.cache_dir)
+        cached = cache.get(self.html)
+        self.assertEqual(cache.stats()["disk_hits"], 1)
+        text = cached.get_elements_by_tag_name("p")[0].children[0]
+        self.assertIsInstance(text, SourceText)
+        self.assertIsNotNone(text.source_text())
+        self.assertEqual(text.text, "Item 0 &amp; more")
+        self.assertEqual("".join(iter_outer_html(cached)), "".join(iter_outer_html(document)))
+
+    def test_remembers_urls_while_cached(self):
+        cache = ParseCache(max_entries=1)
+        cache.put(self.html, HTMLParser(self.html).parse(), "http://example.com/a")
+        self.assertTrue(cache.remembers("http://example.com/a"))
+        self.assertFalse(cache.remembers("http://example.com/b"))
+        other = PAGE.format("<p>Other</p>")
+        cache.put(other, HTMLParser(other).parse(), "http://example.com/b")
+        self.assertFalse(cache.remembers("http://example.com/a"))
+        self.assertTrue(cache.remembers("http://example.com/b"))
+
+
+def _display_available():
+    try:
+        import tkinter
+
+        tkinter.Tk().destroy()
+        return True
+    except Exception:
+        return False
+
+
+@unittest.skipUnless(importlib.util.find_spec("dukpy"), "dukpy is not installed")
+@unittest.skipUnless(_display_available(), "no display")
+class TabReloadTest(unittest.TestCase):
+    def setUp(self):
+        import tkinter
+        from tab import Tab
+
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.site = tempfile.mkdtemp()
+        with open(os.path.join(self.site, "page.html"), "w") as file:
+            file.write(PAGE.format(BODY))
+        handler = functools.partial(
+            http.server.SimpleHTTPRequestHandler, directory=self.site
+        )
+        handler.log_message = lambda *args: None
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/page.html"
+
+        self.window = tkinter.Tk()
+        canvas = tkinter.Canvas(self.window, width=800, height=600)
+
+        class TestTab(Tab):
+            BROWSER_DEFAULT_STYLESHEET = f"file://{root}/browser.css"
+            BROWSER_DEFAULT_JAVASCRIPT = f"file://{root}/runtime.js"
+            PARSE_CACHE = ParseCache()
+
+        self.tab = TestTab(800, 600, canvas)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.window.destroy()
+        shutil.rmtree(self.site)
+
+    def load(self):
+        done = []
+        self.tab.load(self.url, on_loaded=lambda: done.append(True))
+        deadline = time.monotonic() + 30
+        while not done and time.monotonic() < deadline:
+            self.window.update()
+            time.sleep(0.001)
+        self.assertTrue(done, "the page did not load")
+
+    def test_reload_hits_the_parse_cache(self):
+        cache = self.tab.PARSE_CACHE
+        self.load()
+        self.assertEqual(cache.stats()["hits"], 0)
+        self.assertEqual(len(cache.entries), 1)
+        first = "".join(iter_outer_html(self.tab.dom_root))
+
+        self.load()
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(self.tab.title, "Cached")
+        self.assertEqual("".join(iter_outer_html(self.tab.dom_root)), first)
+
+
+if __name__ == "__main__":
+    unittest.main()
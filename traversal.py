@@ -0,0 +1,134 @@
+"""
+Iterative depth-first traversal shared by the DOM and layout trees.
+
+`walk` uses an explicit stack instead of recursion, so it works on arbitrarily
+deep trees and avoids per-call frame overhead. Several visitors can run in the
+same walk, each with its own pre-order (`enter`) and post-order (`leave`) hook.
+`walk_steps` runs the same walk as a generator that can be resumed in slices.
+"""
+
+# Returned from `enter` to not visit the node's children (`leave` is still called).
+SKIP = object()
+# Returned from `enter` or `leave` to stop visiting; other visitors carry on.
+STOP = object()
+
+
+def child_nodes(node):
+    """
+    Default children accessor, works for DOM nodes and layout nodes.
+    """
+    return getattr(node, "children", ())
+
+
+class Visitor:
+    """
+    Base class for traversal hooks. Override `enter` and/or `leave`.
+    """
+
+    def enter(self, node, depth: int):
+        return None
+
+    def leave(self, node, depth: int):
+        return None
+
+
+class FunctionVisitor(Visitor):
+    """
+    Wraps plain `pre(node, depth)` / `post(node, depth)` callables into a `Visitor`.
+    """
+
+    def __init__(self, pre=None, post=None):
+        if pre is not None:
+            self.enter = pre
+        if post is not None:
+            self.leave = post
+
+
+def walk(root, *visitors, pre=None, post=None, children=child_nodes):
+    """
+    Visits `root` and all its descendants in document order.
+
+    :param visitors: `Visitor` objects, called in order for every node.
+    :param pre: Shortcut for a visitor that only has an `enter` hook (may be combined with `post`).
+    :param post: Shortcut for a visitor that only has a `leave` hook.
+    :param children: Function returning the children of a node.
+    """
+    for _ in walk_steps(
+        root, *visitors, pre=pre, post=post, children=children, batch=0
+    ):
+        pass
+
+
+def walk_steps(
+    root, *visitors, pre=None, post=None, children=child_nodes, batch: int = 32
+):
+    """
+    Same as `walk`, but as a generator that yields after every `batch` entered
+    nodes, so that a long walk can be spread over several time slices.
+    A `batch` of 0 never yields.
+    """
+    if root is None:
+        return
+
+    visitors = list(visitors)
+    if pre is not None or post is not None:
+        visitors.append(FunctionVisitor(pre, post))
+    if not visitors:
+        return
+
+    count = len(visitors)
+    enters = [visitor.enter for visitor in visitors]
+    leaves = [visitor.leave for visitor in visitors]
+    # per visitor: the node whose subtree it skips (or STOP once it is done)
+    skipping = [None] * count
+    active = count
+
+    # stack entries: (node, depth, leaving)
+    stack = [(root, 0, False)]
+    visited = 0
+    while stack:
+        node, depth, leaving = stack.pop()
+
+        if leaving:
+            for i in range(count):
+                state = skipping[i]
+                if state is STOP:
+                    continue
+                if state is not None:
+                    if state is not node:
+                        continue
+                    skipping[i] = None
+                if leaves[i](node, depth) is STOP:
+                    skipping[i] = STOP
+                    active -= 1
+            if not active:
+                return
+            continue
+
+        if batch:
+            visited += 1
+            if visited == batch:
+                visited = 0
+                yield
+
+        descend = False
+        for i in range(count):
+            if skipping[i] is not None:
+                continue
+            result = enters[i](node, depth)
+            if result is STOP:
+                skipping[i] = STOP
+                active -= 1
+            elif result is SKIP:
+                skipping[i] = node
+            else:
+                descend = True
+        if not active:
+            return
+
+        stack.append((node, depth, True))
+        if descend:
+            kids = children(node)
+            if kids:
+                for child in reversed(kids):
+                    stack.append((child, depth + 1, False))
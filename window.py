@@ -375,8 +375,7 @@ class Browser:
         self._current_tab().scroll_bar.scrollbar_hover(event.x, event.y, self.canvas)
 
     def _update_canvas(self):
-        self._current_tab().parse()
-        self._current_tab().draw()
+        self._current_tab().relayout()
 
     def _update_url_entry(self):
         self.url_entry.delete(0, "end")
@@ -433,7 +432,7 @@ class Browser:
 
         if 0 <= tab_index < len(self.tabs):
             # Remove the tab and its UI elements
-            self.tabs.pop(tab_index)
+            self.tabs.pop(tab_index).stop()
             self.tab_buttons.pop(tab_index)
             self.close_buttons.pop(tab_index)
 
@@ -476,11 +475,19 @@ class Browser:
                 button.configure(style="ActiveTab.TButton")
             else:
                 button.configure(style="Tab.TButton")
-
-    def _update_tab_title(self, title: str):
-        if title and self.current_tab_pointer < len(self.tab_buttons):
+        # only the current tab may paint on the shared canvas
+        for i, tab in enumerate(self.tabs):
+            tab.active = i == self.current_tab_pointer
+
+    def _update_tab_title(self, tab: Tab):
+        # the tab may have been closed while it was loading
+        if tab not in self.tabs:
+            return
+        index = self.tabs.index(tab)
+        title = tab.title
+        if title and index < len(self.tab_buttons):
             title = title[:10] + "..." if len(title) > 10 else title
-            self.tab_buttons[self.current_tab_pointer].configure(text=title)
+            self.tab_buttons[index].configure(text=title)
 
     def _current_tab(self):
         return self.tabs[self.current_tab_pointer]
@@ -564,8 +571,10 @@ class Browser:
     def load(self, url=None, update_history=True):
         url = url if url is not None else self.url_entry.get()
         if url:
-            self._current_tab().load(url, update_history)
-            self._update_tab_title(self._current_tab().title)
+            tab = self._current_tab()
+            tab.load(
+                url, update_history, on_loaded=lambda: self._update_tab_title(tab)
+            )
             self._update_url_entry()
 
 